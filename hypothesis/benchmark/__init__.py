@@ -1,3 +1,4 @@
 r""""""
 
+from .environment import BatchedBenchmarkEnvironment
 from .environment import BenchmarkEnvironment
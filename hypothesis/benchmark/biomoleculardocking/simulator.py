@@ -1,9 +1,8 @@
 import hypothesis
-import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
-from torch.distributions.bernoulli import Bernoulli
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 
 
 
@@ -17,36 +16,38 @@ class BiomolecularDockingSimulator(BaseSimulator):
         super(BiomolecularDockingSimulator, self).__init__()
         self.default_experimental_design = default_experimental_design
 
+    def simulate_batch(self, theta, psi, random_state=None):
+        r"""Simulates all cells of the ``(batch, design)`` grid together.
+
+        The rows of ``psi`` hold the experimental designs of the rows of
+        ``theta``, a single design of shape ``(design,)`` is shared by all
+        rows. The binding rates of the grid are evaluated as a tensor, after
+        which all outcomes are drawn in a single Bernoulli call.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = theta.view(-1, 4)
+        psi = psi.to(theta.device).view(-1, psi.shape[-1])
+        bottom = theta[:, 0:1]
+        ee50 = theta[:, 1:2]
+        slope = theta[:, 2:3]
+        top = theta[:, 3:4]
+        rate = bottom + (
+            (top - bottom)
+            /
+            (1 + (-(psi - ee50) * slope).exp()))
+
+        return random_state.bernoulli(rate.clamp(0, 1))
+
     def simulate(self, theta, psi):
-        bottom = theta[0].item()
-        ee50 = theta[1].item()
-        slope = theta[2].item()
-        top = theta[3].item()
-        n = len(psi)
-        x = torch.zeros(n)
-        for index in range(n):
-            rate = bottom + (
-                (top - bottom)
-                /
-                (1 + (-(psi[index] - ee50) * slope).exp()))
-            p = Bernoulli(rate)
-            x[index] = p.sample()
-
-        return x
+        return self.simulate_batch(theta.view(1, -1), psi.view(1, -1)).view(-1)
 
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
-        outputs = []
-
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta, psi)
-            else:
-                x = self.simulate(theta, self.default_experimental_design)
-            outputs.append(x.view(-1, 1))
-        outputs = torch.cat(outputs, dim=0)
-
-        return outputs
+        if experimental_configurations is not None:
+            psi = experimental_configurations.view(n, -1)
+        else:
+            psi = self.default_experimental_design.view(1, -1)
+
+        return self.simulate_batch(inputs, psi, random_state)
@@ -4,7 +4,9 @@ r"""Utilities for the Biomolecular Docking benchmark.
 
 import torch
 
+from hypothesis.benchmark.biomoleculardocking.simulator import BiomolecularDockingSimulator
 from hypothesis.exception import IntractableException
+from hypothesis.stat.distribution import ProductPrior
 from torch.distributions.beta import Beta
 from torch.distributions.normal import Normal
 
@@ -19,38 +21,28 @@ def log_likelihood(theta, x):
 
 
 
-class Prior:
+def Prior():
+    r"""Prior over the bottom, ee50, slope and top of the binding curve."""
+    return ProductPrior([
+        Beta(4, 96),
+        Normal(-50, 15),
+        Normal(-0.15, 0.1),
+        Beta(25, 75)])
 
-    def __init__(self):
-        self.r_bottom = Beta(4, 96)
-        self.r_ee50 = Normal(-50, 15 ** 2)
-        self.r_slope = Normal(-0.15, 0.1 ** 2)
-        self.r_top = Beta(25, 75)
 
-    def sample(self, sample_shape=torch.Size()):
-        bottom_samples = self.r_bottom.sample(sample_shape).view(-1, 1)
-        ee50_samples = self.r_ee50.sample(sample_shape).view(-1, 1)
-        slope_samples = self.r_slope.sample(sample_shape).view(-1, 1)
-        top_samples = self.r_top.sample(sample_shape).view(-1, 1)
-        samples = torch.cat([
-            bottom_samples,
-            ee50_samples,
-            slope_samples,
-            top_samples],
-            dim=1)
+def PriorExperiment():
+    r"""Prior over the experimental design space (100 docking scores)."""
+    lower = torch.ones(BiomolecularDockingSimulator.EXPERIMENTAL_SPACE) * BiomolecularDockingSimulator.MIN_PSI
+    upper = torch.ones(BiomolecularDockingSimulator.EXPERIMENTAL_SPACE) * BiomolecularDockingSimulator.MAX_PSI
 
-        return samples
-
-    def log_prob(self, sample):
-        raise IntractableException
+    return Uniform(lower, upper)
 
 
 
-class PriorExperiment(torch.distributions.uniform.Uniform):
+class Uniform(torch.distributions.uniform.Uniform):
 
-    def __init__(self):
-        lower = torch.ones(100) * -75
-        upper = torch.zeros(100)
+    def __init__(self, lower, upper):
+        super(Uniform, self).__init__(lower, upper)
 
     def log_prob(self, sample):
         return super(Uniform, self).log_prob(sample).mean()
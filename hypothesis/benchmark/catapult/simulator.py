@@ -2,7 +2,8 @@ import hypothesis
 import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 from .util import PriorExperiment
 
 
@@ -111,18 +112,122 @@ class CatapultSimulator(BaseSimulator):
             else:
                 return positions[-1][0]
 
+    def simulate_batch(self, theta, psi, trajectory=False, random_state=None):
+        r"""Simulates all projectiles of the batch together.
+
+        The positions and velocities of the batch are integrated as arrays,
+        projectiles which landed or left the observational limit are masked
+        out. If ``trajectory`` is set, the trajectories are recorded in a
+        ragged buffer and returned as ``(outputs, positions, offsets)``, where
+        the trajectory of row ``i`` is ``positions[offsets[i]:offsets[i + 1]]``.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = theta.detach().cpu().double().numpy().reshape(-1)
+        psi = psi.detach().cpu().double().numpy().reshape(-1, 4)
+        n = len(theta)
+        G = theta * (10 ** -11)
+        v_nominal_wind = random_state.normal((n,), dtype=torch.float64).cpu().numpy() * 5 # Meters per second
+        launch_angle = psi[:, 2] + random_state.normal((n,), dtype=torch.float64).cpu().numpy() * 0.1
+        launch_angle = np.clip(launch_angle, self.LAUNCH_ANGLE_LIMIT_LOW, self.LAUNCH_ANGLE_LIMIT_HIGH)
+        launch_force = np.maximum(psi[:, 3], 10)
+        area = psi[:, 0]
+        mass = psi[:, 1]
+        drag_coefficient = 0.05
+        position = np.zeros((n, 2)) # x -> distance, y -> height
+        velocity = np.zeros((n, 2))
+        if trajectory:
+            buffer = _TrajectoryBuffer(capacity=n * (int(0.1 / self.dt) + 1) * 4)
+            buffer.append(np.arange(n), position)
+        else:
+            buffer = None
+
+        # Apply the launching force for a 0.1 second.
+        force = np.stack([np.cos(launch_angle) * launch_force, np.sin(launch_angle) * launch_force], axis=1)
+        for _ in range(int(0.1 / self.dt)):
+            velocity += force * self.dt / mass.reshape(-1, 1)
+            position += velocity * self.dt
+            if buffer is not None:
+                buffer.append(np.arange(n), position)
+
+        # Integrate until the projectiles hit the ground.
+        force_gravitational = -mass * ((G * self.planet_mass) / self.planet_radius ** 2)
+        out_of_bounds = np.zeros(n, dtype=bool)
+        active = np.flatnonzero((position[:, 1] >= 0) & (np.abs(position[:, 0]) <= self.limit))
+        while len(active) > 0:
+            noise = random_state.normal((len(active),), rows=torch.from_numpy(active), dtype=torch.float64)
+            v_wind = v_nominal_wind[active] + 0.01 * noise.cpu().numpy()
+            dv = velocity[active]
+            p_area = area[active]
+            p_mass = mass[active]
+            # Force of the wind component and the drag.
+            force_wind = np.sign(v_wind) * 0.5 * self.air_density * (p_area / p_mass) * (v_wind ** 2)
+            force_drag = np.sign(dv) * 0.5 * drag_coefficient * self.air_density * p_area.reshape(-1, 1) * (dv ** 2)
+            force = -force_drag
+            force[:, 0] += force_wind
+            force[:, 1] += force_gravitational[active]
+            dv += force * self.dt / p_mass.reshape(-1, 1)
+            p = position[active] + dv * self.dt
+            velocity[active] = dv
+            position[active] = p
+            # Check if projectiles are within limits
+            outside = np.abs(p[:, 0]) > self.limit
+            out_of_bounds[active[outside]] = True
+            if buffer is not None:
+                recorded = p.copy()
+                recorded[outside, 0] = np.sign(p[outside, 0]) * self.limit
+                recorded[outside, 1] = 0
+                buffer.append(active, recorded)
+            active = active[(p[:, 1] >= 0) & ~outside]
+
+        x = position[:, 0].copy()
+        x[out_of_bounds] = np.sign(x[out_of_bounds]) * self.limit
+        if self.record_wind:
+            outputs = np.stack([v_nominal_wind, x], axis=1)
+        else:
+            outputs = x.reshape(-1, 1)
+        outputs = torch.from_numpy(outputs).float()
+        if buffer is not None:
+            positions, offsets = buffer.finalize(n)
+            return outputs, torch.from_numpy(positions), torch.from_numpy(offsets)
+
+        return outputs
+
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations):
-        outputs = []
+    def forward(self, inputs, experimental_configurations, random_state=None):
+        return self.simulate_batch(inputs, experimental_configurations, random_state=random_state)
+
+
+
+class _TrajectoryBuffer:
+    r"""Ragged buffer of the trajectories of a batch of projectiles.
+
+    Positions are appended step by step for the rows in flight, and grouped
+    per row when the buffer is finalized."""
+
+    def __init__(self, capacity):
+        self.positions = np.empty((capacity, 2))
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, rows, positions):
+        k = len(rows)
+        # Grow the buffer geometrically if required.
+        if self.size + k > len(self.rows):
+            capacity = max(2 * len(self.rows), self.size + k)
+            self.positions = np.resize(self.positions, (capacity, 2))
+            self.rows = np.resize(self.rows, capacity)
+        self.positions[self.size:self.size + k] = positions
+        self.rows[self.size:self.size + k] = rows
+        self.size += k
 
-        n = len(inputs)
-        for index in range(n):
-            theta = inputs[index].view(-1)
-            psi = experimental_configurations[index].view(-1)
-            output = self.simulate(theta, psi).reshape(1, -1)
-            outputs.append(torch.from_numpy(output))
+    def finalize(self, n):
+        rows = self.rows[:self.size]
+        order = np.argsort(rows, kind="stable")
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(rows, minlength=n))
 
-        return torch.cat(outputs, dim=0).float()
+        return self.positions[:self.size][order], offsets
 
 
 
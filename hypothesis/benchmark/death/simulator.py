@@ -1,9 +1,8 @@
 import hypothesis
-import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
-from torch.distributions.binomial import Binomial
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 
 
 
@@ -15,39 +14,51 @@ class DeathModelSimulator(BaseSimulator):
         self.population_size = int(population_size)
         self.step_size = float(step_size)
 
+    def simulate_batch(self, theta, psi, random_state=None):
+        r"""Simulates all cells of the ``(batch, design)`` grid together.
+
+        Every row of ``theta`` holds an infection rate, and every row of
+        ``psi`` one or more measurement times. Every cell of the grid is an
+        independent simulation. The populations are advanced as a tensor with
+        batched binomial draws, cells whose measurement time has been reached,
+        or of which the population has been infected entirely, are masked out.
+        The draws of the rows with an active cell cover all cells of the row,
+        such that a cell only depends on the stream of its row.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        n = theta.shape[0]
+        psi = psi.to(theta.device).float().view(n, -1)
+        infection_rate = theta.view(n, 1).double().expand_as(psi).reshape(-1)
+        population_size = float(self.population_size)
+        infection_rate = infection_rate.view(psi.shape)
+        I = torch.zeros(psi.shape, dtype=torch.float64, device=theta.device)
+        n_steps = (psi / self.step_size).long()
+        for step in range(int(n_steps.max().item()) if I.numel() > 0 else 0):
+            active = (n_steps > step) & (I < population_size)
+            rows = active.any(dim=1).nonzero().view(-1)
+            if len(rows) == 0: # State will remain the same.
+                break
+            t = step * self.step_size
+            p_infection = 1 - (-infection_rate[rows] * t).exp()
+            # Finished cells have no susceptible individuals left to infect.
+            susceptible = (population_size - I[rows]) * active[rows]
+            I[rows] += random_state.binomial(susceptible, p_infection.clamp(0, 1), rows=rows)
+
+        return I.float()
+
     def simulate(self, theta, psi):
         # theta = [beta, gamma]
         # psi = tau
         # sample = [S(tau), I(tau), R(tau)]
-        infection_rate = theta.item()
-        design = psi.item()
-        I = 0
-        t = 0.0
-        n_steps = int(psi / self.step_size)
-        for _ in range(n_steps):
-            S = self.population_size - I
-            if S == 0:
-                break
-            p_inf = 1 - np.exp(-infection_rate * t)
-            delta_I = int(Binomial(S, p_inf).sample())
-            I += delta_I
-            t += self.step_size
-
-        return torch.tensor(I).float()
+        return self.simulate_batch(theta.view(1, 1), psi.view(1, 1)).view(())
 
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
-        outputs = []
-
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta, psi)
-            else:
-                x = self.simulate(theta, self.default_measurement_time)
-            outputs.append(x.view(1, -1))
-        outputs = torch.cat(outputs, dim=0)
-
-        return outputs
+        if experimental_configurations is not None:
+            psi = experimental_configurations.view(n, -1)
+        else:
+            psi = self.default_measurement_time.expand(n, 1)
+
+        return self.simulate_batch(inputs, psi, random_state)
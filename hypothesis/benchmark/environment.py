@@ -73,3 +73,110 @@ class BenchmarkEnvironment(BaseEnvironment):
             self.truth = self.prior.sample().view(1, -1)
         else:
             self.truth = self.predefined_truth.view(1, -1)
+
+
+
+class BatchedBenchmarkEnvironment(BaseEnvironment):
+    r"""Steps ``num_environments`` independent benchmark environments at once.
+
+    Every environment has its own truth drawn from the prior. A step takes
+    the stacked experiments of shape ``(num_environments, ...)`` and performs
+    all of them in a single simulator call. The experiments, observations
+    and rewards are stored in preallocated tensors of shape
+    ``(num_environments, max_experiments, ...)``.
+
+    The entropy estimator is called with the histories up to the current
+    experiment, ``(num_environments, experiments, ...)`` views of the
+    preallocated tensors, and should return the entropy of every environment.
+    The simulator is called with the experiments as the ``design_keyword``
+    argument.
+    """
+
+    def __init__(self, simulator,
+            prior,
+            prior_experiment,
+            entropy_estimator,
+            num_environments=1,
+            max_experiments=10,
+            truth=None,
+            design_keyword="designs"):
+        super(BatchedBenchmarkEnvironment, self).__init__()
+        # Check if a simulation model has been specified
+        if simulator is None:
+            raise ValueError("A simulation model is required.")
+        # Check if an entropy estimator has been specified.
+        if entropy_estimator is None:
+            raise ValueError("An entropy-estimator is required.")
+        # Environment properties
+        self.design_keyword = design_keyword
+        self.entropy_estimator = entropy_estimator
+        self.max_experiments = int(max_experiments)
+        self.num_environments = int(num_environments)
+        self.predefined_truth = truth
+        self.prior = prior
+        self.prior_experiment = prior_experiment
+        self.simulator = simulator
+        # Environment history, allocated on the first experiment.
+        self.actions = None
+        self.observations = None
+        self.rewards = None
+        # Environment state
+        self.reset()
+
+    def _allocate(self, actions, observations):
+        shape = (self.num_environments, self.max_experiments)
+        self.actions = actions.new_zeros(shape + actions.shape[1:])
+        self.observations = observations.new_zeros(shape + observations.shape[1:])
+        self.rewards = observations.new_zeros(shape, dtype=torch.float32)
+
+    @torch.no_grad()
+    def _perform_experiments(self, experiments):
+        arguments = {"inputs": self.truth, self.design_keyword: experiments}
+
+        return self.simulator(**arguments)
+
+    def _reward(self):
+        r"""We negate the entropy as the reward needs to be maximized."""
+        n = self.conducted_experiments
+
+        return -self.entropy_estimator(self.actions[:, :n], self.observations[:, :n]).view(-1)
+
+    @torch.no_grad()
+    def summary(self):
+        r"""Copies of the histories, the preallocated tensors are reused by the next episodes."""
+        n = self.conducted_experiments
+        if self.actions is None:
+            return {"experiments": None, "observations": None, "rewards": None, "truth": self.truth}
+
+        return {
+            "experiments": self.actions[:, :n].clone(),
+            "observations": self.observations[:, :n].clone(),
+            "rewards": self.rewards[:, :n].clone(),
+            "truth": self.truth}
+
+    def step(self, actions):
+        assert(self.conducted_experiments < self.max_experiments)
+        actions = actions.view(self.num_environments, -1)
+        observations = self._perform_experiments(actions)
+        if self.actions is None:
+            self._allocate(actions, observations)
+        index = self.conducted_experiments
+        self.actions[:, index] = actions.detach()
+        self.observations[:, index] = observations.detach()
+        self.conducted_experiments += 1
+        rewards = self._reward()
+        self.rewards[:, index] = rewards.detach()
+        done = (self.conducted_experiments >= self.max_experiments)
+
+        return observations, rewards, done, self.summary()
+
+    @torch.no_grad()
+    def reset(self):
+        self.conducted_experiments = 0
+        if self.predefined_truth is None:
+            self.truth = self.prior.sample(torch.Size([self.num_environments])).view(self.num_environments, -1)
+        else:
+            self.truth = self.predefined_truth.view(-1, self.predefined_truth.shape[-1]).expand(self.num_environments, -1)
+        # Keep the allocated history, only the experiments which have been conducted are valid.
+        if self.rewards is not None:
+            self.rewards.zero_()
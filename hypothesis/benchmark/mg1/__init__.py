@@ -1,4 +1,5 @@
 from .simulator import MG1Simulator
+from .simulator import MG1Simulator as Simulator
 from .util import Prior
 from .util import Truth
 from .util import log_likelihood
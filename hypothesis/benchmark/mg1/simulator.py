@@ -2,11 +2,12 @@ import numpy as np
 import numpy.random as rng
 import torch
 
-from hypothesis.simulation import Simulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator
 
 
 
-class MG1Simulator(Simulator):
+class MG1Simulator(SeededSimulator):
     r"""Simulation model of the M/G/1 queuing model.
 
     This model describes a queuing system of continuously arriving jobs by a
@@ -22,7 +23,7 @@ class MG1Simulator(Simulator):
     """
 
     def __init__(self, percentiles=5, steps=50):
-        super(Simulator, self).__init__()
+        super(MG1Simulator, self).__init__()
         self.percentiles = int(percentiles)
         self.steps = int(steps)
 
@@ -32,31 +33,58 @@ class MG1Simulator(Simulator):
         p2 = input[1].item()
         p3 = input[2].item()
         # Service / processing time.
-        sts = (p2 - p1) * rng.random(self.num_steps) + p1
+        sts = (p2 - p1) * rng.random(self.steps) + p1
         # Interarrival times.
-        iats = -np.log(1.0 - rng.rand(self.num_steps)) / p3
+        iats = -np.log(1.0 - rng.rand(self.steps)) / p3
         # Arrival times.
         ats = np.cumsum(iats)
         # Interdeparture and departure times.
-        idts = np.empty(self.num_steps)
-        dts = np.empty(self.num_steps)
+        idts = np.empty(self.steps)
+        dts = np.empty(self.steps)
         idts[0] = sts[0] + ats[0]
         dts[0] = idts[0]
-        for i in range(1, self.num_steps):
+        for i in range(1, self.steps):
             idts[i] = sts[i] + max(0.0, ats[i] - dts[i-1])
             dts[i] = dts[i-1] + idts[i]
         # Compute the observation.
-        perc = np.linspace(0.0, 100.0, self.num_percentiles)
+        perc = np.linspace(0.0, 100.0, self.percentiles)
         stats = np.percentile(idts, perc)
 
         return torch.tensor(stats).float().view(1, -1)
 
-    def forward(self, inputs):
-        r""""""
-        samples = []
+    def simulate_batch(self, inputs, random_state=None):
+        r"""Simulates all rows of the batch together.
 
-        for input in inputs:
-            x_out = self._generate(input)
-            samples.append(x_out.view(1, -1))
+        The service and interarrival times of the batch are drawn as
+        ``(batch, steps)`` arrays. The departure recursion
+        :math:`d_i = \max(d_{i-1}, a_i) + p_i` is unrolled as
+        :math:`d_i = P_i + \max_{k \leq i} (a_k - P_{k - 1})`, with :math:`P`
+        the cumulative processing time, which is a cumulative maximum over
+        the steps of every row.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        inputs = inputs.detach().cpu().double().numpy().reshape(-1, 3)
+        n = inputs.shape[0]
+        p1 = inputs[:, 0:1]
+        p2 = inputs[:, 1:2]
+        p3 = inputs[:, 2:3]
+        # Service / processing time.
+        sts = (p2 - p1) * random_state.uniform((n, self.steps), dtype=torch.float64).cpu().numpy() + p1
+        # Interarrival times.
+        iats = -np.log(1.0 - random_state.uniform((n, self.steps), dtype=torch.float64).cpu().numpy()) / p3
+        # Arrival times.
+        ats = np.cumsum(iats, axis=1)
+        # Interdeparture and departure times.
+        cumulative_sts = np.cumsum(sts, axis=1)
+        dts = cumulative_sts + np.maximum.accumulate(ats - cumulative_sts + sts, axis=1)
+        idts = np.diff(dts, axis=1, prepend=0.0)
+        # Compute the observations.
+        perc = np.linspace(0.0, 100.0, self.percentiles)
+        stats = np.percentile(idts, perc, axis=1).T
+
+        return torch.from_numpy(stats).float()
 
-        return torch.cat(samples, dim=0)
+    def forward(self, inputs, random_state=None):
+        r""""""
+        return self.simulate_batch(inputs, random_state)
@@ -1,3 +1,4 @@
+from .environment import BatchedEnvironment
 from .environment import Environment
 from .simulator import NormalSimulator as Simulator
 from .util import Prior
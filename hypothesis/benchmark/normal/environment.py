@@ -4,6 +4,7 @@ import torch
 from .simulator import NormalSimulator as Simulator
 from .util import Prior
 from .util import PriorExperiment
+from hypothesis.benchmark import BatchedBenchmarkEnvironment
 from hypothesis.benchmark import BenchmarkEnvironment
 
 
@@ -20,3 +21,21 @@ class Environment(BenchmarkEnvironment):
             prior_experiment=PriorExperiment(),
             simulator=Simulator(),
             truth=truth)
+
+
+
+class BatchedEnvironment(BatchedBenchmarkEnvironment):
+
+    def __init__(self, entropy_estimator,
+        num_environments=1,
+        max_experiments=10,
+        truth=None):
+        super(BatchedEnvironment, self).__init__(
+            entropy_estimator=entropy_estimator,
+            num_environments=num_environments,
+            max_experiments=max_experiments,
+            prior=Prior(),
+            prior_experiment=PriorExperiment(),
+            simulator=Simulator(),
+            truth=truth,
+            design_keyword="designs")
@@ -1,11 +1,10 @@
-import torch
 
-from hypothesis.simulation import Simulator
-from torch.distributions.normal import Normal
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator
 
 
 
-class NormalSimulator(Simulator):
+class NormalSimulator(SeededSimulator):
     r"""
 
     Todo:
@@ -16,8 +15,11 @@ class NormalSimulator(Simulator):
         super(NormalSimulator, self).__init__()
         self.uncertainty = float(uncertainty)
 
-    def forward(self, inputs, designs=None):
+    def forward(self, inputs, designs=None, random_state=None):
+        if random_state is None:
+            random_state = RandomState()
         if designs is None:
             designs = self.uncertainty
+        noise = random_state.normal(inputs.shape, dtype=inputs.dtype, device=inputs.device)
 
-        return Normal(inputs, designs).sample()
+        return inputs + designs * noise
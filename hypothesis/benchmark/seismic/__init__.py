@@ -0,0 +1,5 @@
+from .simulator import SeismicSimulator as Simulator
+from .util import Prior
+from .util import PriorExperiment
+from .util import Truth
+from .util import log_likelihood
@@ -5,17 +5,171 @@ Based on the codebase of: Nimar Arora https://github.com/nimar/seismic-2d/blob/m
 """
 
 import hypothesis
-import numpy as np
+import math
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 
 
 
 class SeismicSimulator(BaseSimulator):
+    r"""Simulation model of the detections of a seismic event by a network of stations.
 
-    def __init__(self):
+    The world is the surface of a sphere. Every simulation generates a single
+    event with a longitude, latitude and magnitude (the inputs), which is
+    detected by every station with a probability decreasing with the distance
+    and increasing with the magnitude. Detections have a noisy arrival time,
+    azimuth, slowness and log amplitude.
+
+    The physics of the world (the detection, residual and amplitude
+    parameters of every station) are drawn once from their priors when the
+    simulator is constructed, with a private generator seeded by ``seed``,
+    such that simulators constructed in different processes share the same
+    world. A ``seed`` of ``None`` draws a new world. The locations of the
+    stations are the experimental design, with the layout
+    ``[longitudes, latitudes]`` of shape ``(2 * num_stations,)``.
+
+    The outputs have the shape ``(batch, num_stations, 5)`` and hold for
+    every station ``[detected, arrival time, azimuth, slowness, log amplitude]``,
+    where the features of missed detections are 0. All events and stations
+    of a batch are simulated together with tensor operations.
+    """
+
+    def __init__(self, num_stations=10, seed=0):
         super(SeismicSimulator, self).__init__()
+        self.num_stations = int(num_stations)
+        self.seed = seed
+        if seed is not None:
+            generator = torch.Generator()
+            generator.manual_seed(int(seed))
+        else:
+            generator = None # A different world for every simulator.
+        self._generate_physics(generator)
+
+    def _normal(self, loc, scale, generator):
+        return loc + scale * torch.randn(self.num_stations, generator=generator)
+
+    def _inverse_gamma(self, concentration, rate, generator):
+        # Marsaglia and Tsang (concentration >= 1), ``Gamma`` does not accept a generator.
+        d = concentration - 1 / 3
+        c = 1 / math.sqrt(9 * d)
+        samples = torch.empty(self.num_stations)
+        pending = torch.arange(self.num_stations)
+        while len(pending) > 0:
+            x = torch.randn(len(pending), generator=generator)
+            v = (1 + c * x) ** 3
+            u = torch.rand(len(pending), generator=generator)
+            accepted = (v > 0) & (u.log() < 0.5 * x ** 2 + d - d * v + d * v.clamp(min=1e-12).log())
+            samples[pending[accepted]] = d * v[accepted]
+            pending = pending[~accepted]
+
+        return rate / samples
+
+    def _generate_physics(self, generator):
+        n = self.num_stations
+        physics = {}
+        # Default locations of the stations, uniform on the sphere.
+        longitudes = torch.rand(n, generator=generator) * 360 - 180
+        latitudes = torch.rad2deg(torch.asin(torch.rand(n, generator=generator) * 2 - 1))
+        physics["default_stations"] = torch.cat([longitudes, latitudes])
+        # Coefficients of the detection probability, logistic in the magnitude and distance.
+        physics["mu_d0"] = self._normal(-10.4, 1.0, generator)
+        physics["mu_d1"] = self._normal(3.26, 0.1, generator)
+        physics["mu_d2"] = self._normal(-0.0499, 0.001, generator)
+        # Laplace residuals of the arrival time, azimuth and slowness.
+        physics["mu_t"] = self._normal(0.0, 1.0, generator)
+        physics["theta_t"] = self._inverse_gamma(120.0, 118.0, generator)
+        physics["mu_z"] = self._normal(0.0, 1.0, generator)
+        physics["theta_z"] = self._inverse_gamma(5.2, 6.7, generator)
+        physics["mu_s"] = self._normal(0.0, 1.0, generator)
+        physics["theta_s"] = self._inverse_gamma(6.7, 7.5, generator)
+        # Log amplitude, linear in the magnitude and distance.
+        physics["mu_a0"] = self._normal(-7.3, 1.0, generator)
+        physics["mu_a1"] = self._normal(2.03, 0.1, generator)
+        physics["mu_a2"] = self._normal(-0.00196, 0.0001, generator)
+        physics["sigma_a"] = self._inverse_gamma(21.1, 12.6, generator).sqrt()
+        # Buffers follow the simulator across devices.
+        for name, value in physics.items():
+            self.register_buffer(name, value)
+
+    @staticmethod
+    def compute_distance(longitude_1, latitude_1, longitude_2, latitude_2):
+        r"""Great circle distance in degrees."""
+        longitude_1, latitude_1 = torch.deg2rad(longitude_1), torch.deg2rad(latitude_1)
+        longitude_2, latitude_2 = torch.deg2rad(longitude_2), torch.deg2rad(latitude_2)
+        a = (torch.sin((latitude_2 - latitude_1) / 2) ** 2
+            + torch.cos(latitude_1) * torch.cos(latitude_2) * torch.sin((longitude_2 - longitude_1) / 2) ** 2)
+
+        return torch.rad2deg(2 * torch.asin(a.clamp(0, 1).sqrt()))
+
+    @staticmethod
+    def compute_azimuth(longitude_1, latitude_1, longitude_2, latitude_2):
+        r"""Azimuth in degrees of the second location, as seen from the first."""
+        longitude_1, latitude_1 = torch.deg2rad(longitude_1), torch.deg2rad(latitude_1)
+        longitude_2, latitude_2 = torch.deg2rad(longitude_2), torch.deg2rad(latitude_2)
+        delta = longitude_2 - longitude_1
+        y = torch.sin(delta) * torch.cos(latitude_2)
+        x = (torch.cos(latitude_1) * torch.sin(latitude_2)
+            - torch.sin(latitude_1) * torch.cos(latitude_2) * torch.cos(delta))
+
+        return torch.rad2deg(torch.atan2(y, x)) % 360
+
+    @staticmethod
+    def compute_travel_time(distance):
+        return -0.023 * distance ** 2 + 10.7 * distance + 5
+
+    @staticmethod
+    def compute_slowness(distance):
+        return -0.046 * distance + 10.7
+
+    def _laplace(self, loc, scale, shape, random_state):
+        # Inverse transform, ``torch.distributions`` does not accept a generator.
+        u = random_state.uniform(shape + loc.shape, device=loc.device) - 0.5
+        u = u.clamp(-0.5 + 1e-7, 0.5)
+
+        return loc - scale * u.sign() * torch.log1p(-2 * u.abs())
+
+    def simulate_batch(self, theta, psi, random_state=None):
+        r"""Simulates the detections of the events ``theta`` by the stations ``psi``.
+
+        ``theta`` has the shape ``(batch, 3)`` and ``psi`` the shape
+        ``(batch, 2 * num_stations)``, or ``(2 * num_stations,)`` for a
+        network shared by all events.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = theta.view(-1, 3).float()
+        n = theta.shape[0]
+        stations = psi.to(theta.device).float().view(-1, 2, self.num_stations).expand(n, 2, self.num_stations)
+        shape = torch.Size([n])
+        # Broadcast the events over the stations.
+        event_longitude = theta[:, 0:1]
+        event_latitude = theta[:, 1:2]
+        magnitude = theta[:, 2:3]
+        station_longitude = stations[:, 0, :]
+        station_latitude = stations[:, 1, :]
+        distance = self.compute_distance(station_longitude, station_latitude, event_longitude, event_latitude)
+        # Sample the detections.
+        logits = self.mu_d0 + self.mu_d1 * magnitude + self.mu_d2 * distance
+        detected = random_state.bernoulli(torch.sigmoid(logits))
+        # Sample the features of the detections.
+        time = self.compute_travel_time(distance) + self._laplace(self.mu_t, self.theta_t, shape, random_state)
+        azimuth = (self.compute_azimuth(station_longitude, station_latitude, event_longitude, event_latitude)
+            + self._laplace(self.mu_z, self.theta_z, shape, random_state)) % 360
+        slowness = self.compute_slowness(distance) + self._laplace(self.mu_s, self.theta_s, shape, random_state)
+        noise = random_state.normal(shape + self.sigma_a.shape, device=self.sigma_a.device)
+        amplitude = self.mu_a0 + self.mu_a1 * magnitude + self.mu_a2 * distance + self.sigma_a * noise
+        features = torch.stack([time, azimuth, slowness, amplitude], dim=2)
+        features = torch.where(detected.bool().unsqueeze(2), features, torch.zeros_like(features))
+
+        return torch.cat([detected.unsqueeze(2), features], dim=2)
+
+    @torch.no_grad()
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
+        if experimental_configurations is not None:
+            psi = experimental_configurations.view(len(inputs), -1)
+        else:
+            psi = self.default_stations
 
-    def forward(self, inputs, experimental_configurations=None):
-        raise NotImplementedError
+        return self.simulate_batch(inputs, psi, random_state)
@@ -0,0 +1,75 @@
+r"""Utilities for the seismic benchmark.
+
+"""
+
+import math
+import torch
+
+from hypothesis.exception import IntractableException
+from hypothesis.stat.distribution import ProductPrior
+from torch.distributions import constraints
+from torch.distributions.distribution import Distribution
+from torch.distributions.exponential import Exponential
+from torch.distributions.transformed_distribution import TransformedDistribution
+from torch.distributions.transforms import AffineTransform
+from torch.distributions.uniform import Uniform
+
+
+
+def Prior():
+    r"""Prior over the longitude, latitude and magnitude of the event.
+
+    The events are uniformly distributed over the sphere, and the magnitudes
+    follow the Gutenberg-Richter law above a magnitude of 3.
+    """
+    return ProductPrior([Uniform(-180.0, 180.0), UniformLatitude(), GutenbergRichter(3.0)])
+
+
+def PriorExperiment(num_stations=10):
+    r"""Prior over the experimental design space (the locations of the stations)."""
+    return ProductPrior([
+        Uniform(-180 * torch.ones(num_stations), 180 * torch.ones(num_stations)),
+        UniformLatitude(torch.Size([num_stations]))])
+
+
+def Truth():
+    return torch.tensor([30.0, 10.0, 4.5])
+
+
+def log_likelihood(theta, x):
+    raise IntractableException
+
+
+
+class UniformLatitude(Distribution):
+    r"""Distribution of the latitude (in degrees) of locations uniform on the sphere."""
+
+    arg_constraints = {}
+    support = constraints.interval(-90., 90.)
+
+    def __init__(self, batch_shape=torch.Size()):
+        super(UniformLatitude, self).__init__(batch_shape=batch_shape, validate_args=False)
+
+    def sample(self, sample_shape=torch.Size()):
+        u = torch.rand(self._extended_shape(sample_shape)) * 2 - 1
+
+        return torch.rad2deg(torch.asin(u))
+
+    def log_prob(self, value):
+        inside = value.abs() <= 90
+        density = torch.cos(torch.deg2rad(value.clamp(-90, 90))) / 2 * (math.pi / 180)
+
+        return torch.where(inside, density.log(), torch.full_like(density, -math.inf))
+
+
+
+class GutenbergRichter(TransformedDistribution):
+    r"""Distribution of the magnitudes above ``minimum`` under the Gutenberg-Richter law."""
+
+    def __init__(self, minimum=3.0, b=1.0):
+        self.minimum = minimum
+        super(GutenbergRichter, self).__init__(Exponential(b * math.log(10)), AffineTransform(minimum, 1.0))
+
+    @constraints.dependent_property
+    def support(self):
+        return constraints.greater_than_eq(self.minimum)
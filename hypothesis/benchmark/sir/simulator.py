@@ -2,7 +2,8 @@ import hypothesis
 import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 from torch.distributions.binomial import Binomial
 
 
@@ -38,18 +39,45 @@ class SIRSimulator(BaseSimulator):
         return torch.tensor([S, I, R]).float()
 
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
-        outputs = []
+    def simulate_batch(self, theta, psi, random_state=None):
+        r"""Simulates all rows of the batch together.
 
+        The compartments of the batch are advanced as tensors with batched
+        binomial draws. Rows whose measurement time has been reached, or in
+        which the epidemic has ended, are masked out.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = theta.view(-1, 2).double()
+        beta = theta[:, 0]
+        gamma = theta[:, 1]
+        n = theta.shape[0]
+        population_size = float(self.population_size)
+        S = torch.full((n,), population_size - 1, dtype=torch.float64, device=theta.device)
+        I = torch.ones(n, dtype=torch.float64, device=theta.device)
+        R = torch.zeros(n, dtype=torch.float64, device=theta.device)
+        n_steps = (psi.view(-1).double().to(theta.device) / self.step_size).long()
+        for step in range(int(n_steps.max().item()) if n > 0 else 0):
+            active = ((n_steps > step) & (I > 0)).nonzero().view(-1)
+            if len(active) == 0: # State will remain the same.
+                break
+            S_active = S[active]
+            I_active = I[active]
+            p_infection = (beta[active] * I_active / population_size).clamp(0, 1)
+            delta_I = random_state.binomial(S_active, p_infection, rows=active)
+            delta_R = random_state.binomial(I_active, gamma[active].clamp(0, 1), rows=active)
+            S[active] = S_active - delta_I
+            I[active] = I_active + delta_I - delta_R
+            R[active] += delta_R
+
+        return torch.stack([S, I, R], dim=1).float()
+
+    @torch.no_grad()
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta, psi)
-            else:
-                x = self.simulate(theta, self.default_measurement_time)
-            outputs.append(x.view(1, -1))
-        outputs = torch.cat(outputs, dim=0)
-
-        return outputs
+        if experimental_configurations is not None:
+            psi = experimental_configurations.view(n)
+        else:
+            psi = self.default_measurement_time.expand(n)
+
+        return self.simulate_batch(inputs, psi, random_state)
@@ -3,3 +3,4 @@ from .util import Prior
 from .util import PriorExperiment
 from .util import Truth
 from .util import log_likelihood
+from .util import unpack
@@ -2,7 +2,8 @@ import hypothesis
 import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 from scipy import signal
 from torch.distributions.poisson import Poisson
 
@@ -10,9 +11,14 @@ from torch.distributions.poisson import Poisson
 
 class SpatialSIRSimulator(BaseSimulator):
 
-    def __init__(self, initial_infections_rate=3, shape=(100, 100), default_measurement_time=1.0, step_size=0.01):
+    PACKINGS = [None, "bool", "uint8", "bits"]
+
+    def __init__(self, initial_infections_rate=3, shape=(100, 100), default_measurement_time=1.0, step_size=0.01, packing=None):
         super(SpatialSIRSimulator, self).__init__()
+        if packing not in self.PACKINGS:
+            raise ValueError("The packing", packing, "is not supported.")
         self.default_measurement_time = default_measurement_time
+        self.packing = packing
         self.lattice_shape = shape
         self.p_initial_infections = Poisson(float(initial_infections_rate))
         self.simulation_step_size = step_size
@@ -25,9 +31,9 @@ class SpatialSIRSimulator(BaseSimulator):
         beta = theta[0].item()  # Infection rate
         gamma = theta[1].item() # Recovery rate
         # Allocate the data grids.
-        infected = np.zeros(self.lattice_shape, dtype=np.int)
-        recovered = np.zeros(self.lattice_shape, dtype=np.int)
-        kernel = np.ones((3, 3), dtype=np.int)
+        infected = np.zeros(self.lattice_shape, dtype=int)
+        recovered = np.zeros(self.lattice_shape, dtype=int)
+        kernel = np.ones((3, 3), dtype=int)
         # Seed the grid with the initial infections.
         num_initial_infections = self._sample_num_initial_infections()
         for _ in range(num_initial_infections):
@@ -44,12 +50,12 @@ class SpatialSIRSimulator(BaseSimulator):
             potential = signal.convolve2d(infected, kernel, mode="same")
             potential *= susceptible
             potential = potential * beta / 8
-            next_infected = ((potential > np.random.uniform(size=self.lattice_shape)).astype(np.int) + infected) * (1 - recovered)
-            next_infected = (next_infected >= 1).astype(np.int)
+            next_infected = ((potential > np.random.uniform(size=self.lattice_shape)).astype(int) + infected) * (1 - recovered)
+            next_infected = (next_infected >= 1).astype(int)
             # Recover
             potential = infected * gamma
-            next_recovered = (potential > np.random.uniform(size=self.lattice_shape)).astype(np.int) + recovered
-            next_recovered = (next_recovered >= 1).astype(np.int)
+            next_recovered = (potential > np.random.uniform(size=self.lattice_shape)).astype(int) + recovered
+            next_recovered = (next_recovered >= 1).astype(int)
             # Next parameters
             recovered = next_recovered
             infected = next_infected
@@ -62,18 +68,107 @@ class SpatialSIRSimulator(BaseSimulator):
 
         return image
 
+    def _sample_initial_infections(self, n, device, random_state):
+        height, width = self.lattice_shape
+        rates = self.p_initial_infections.rate.expand(n).to(device)
+        num_initial_infections = 1 + random_state.poisson(rates).long()
+        max_initial_infections = int(num_initial_infections.max().item())
+        positions = torch.zeros(n, max_initial_infections, dtype=torch.long, device=device)
+        for index in range(max_initial_infections):
+            infecting = (num_initial_infections > index).nonzero().view(-1)
+            u = random_state.uniform((len(infecting),), rows=infecting, dtype=torch.float64, device=device)
+            positions[infecting, index] = (u * (height * width)).long()
+        mask = torch.arange(max_initial_infections, device=device).view(1, -1) < num_initial_infections.view(-1, 1)
+        rows = torch.arange(n, device=device).view(-1, 1).expand_as(positions)
+        infected = torch.zeros(n, height * width, device=device)
+        infected[rows[mask], positions[mask]] = 1
+
+        return infected.view(n, 1, height, width)
+
+    @staticmethod
+    def _count_neighbours(lattices):
+        r"""Batched 3x3 box convolution with zero padding.
+
+        The box kernel is separable, summing shifted views along both axes
+        is much cheaper than a generic convolution on a single channel."""
+        padded = torch.nn.functional.pad(lattices, (1, 1, 1, 1))
+        counts = padded[:, :, :-2] + padded[:, :, 1:-1] + padded[:, :, 2:]
+
+        return counts[..., :-2] + counts[..., 1:-1] + counts[..., 2:]
+
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
-        outputs = []
+    def simulate_batch(self, theta, psi, random_state=None):
+        r"""Simulates all rows of the batch together.
 
+        The lattices of the batch are stored as a single ``(N, 1, H, W)``
+        tensor, and the infected neighbours of every cell are counted by a
+        single batched box convolution. Epidemics which have ended, or have
+        reached their measurement time, are retired from the working set.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = theta.view(-1, 2).float()
+        n = theta.shape[0]
+        device = theta.device
+        infected = self._sample_initial_infections(n, device, random_state).bool()
+        recovered = torch.zeros_like(infected)
+        n_steps = (psi.view(-1).double().to(device) / self.simulation_step_size).long()
+        # Working set of the ongoing epidemics.
+        active = torch.arange(n, device=device)
+        beta = theta[:, 0].view(-1, 1, 1, 1) / 8
+        gamma = theta[:, 1].view(-1, 1, 1, 1)
+        infected_active = infected
+        recovered_active = recovered
+        steps_active = n_steps
+        step = 0
+        while len(active) > 0:
+            ongoing = (steps_active > step) & infected_active.view(len(active), -1).any(dim=1)
+            # Retire the finished epidemics.
+            if not ongoing.all():
+                finished = ~ongoing
+                infected[active[finished]] = infected_active[finished]
+                recovered[active[finished]] = recovered_active[finished]
+                active = active[ongoing]
+                beta = beta[ongoing]
+                gamma = gamma[ongoing]
+                infected_active = infected_active[ongoing]
+                recovered_active = recovered_active[ongoing]
+                steps_active = steps_active[ongoing]
+                if len(active) == 0:
+                    break
+            susceptible = ~(infected_active | recovered_active)
+            # Infection
+            potential = self._count_neighbours(infected_active.float()) * beta
+            next_infected = (random_state.uniform(potential.shape, rows=active, device=device) < potential) & susceptible
+            next_infected |= infected_active & ~recovered_active
+            # Recover
+            next_recovered = (random_state.uniform(potential.shape, rows=active, device=device) < gamma) & infected_active
+            next_recovered |= recovered_active
+            infected_active = next_infected
+            recovered_active = next_recovered
+            step += 1
+        infected = infected.float()
+        recovered = recovered.float()
+        susceptible = (1 - recovered) * (1 - infected)
+
+        return torch.cat([susceptible, infected, recovered], dim=1)
+
+    def _pack(self, images):
+        if self.packing == "bool":
+            images = images.bool()
+        elif self.packing == "uint8":
+            images = images.to(torch.uint8)
+        elif self.packing == "bits":
+            images = torch.from_numpy(np.packbits(images.cpu().numpy().astype(np.uint8), axis=-1))
+
+        return images
+
+    @torch.no_grad()
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
         n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta, psi.item())
-            else:
-                x = self.simulate(theta, self.default_measurement_time)
-            outputs.append(x)
-
-        return torch.cat(outputs, dim=0).float()
+        if experimental_configurations is not None:
+            psi = experimental_configurations.view(n)
+        else:
+            psi = torch.tensor(self.default_measurement_time).expand(n)
+
+        return self._pack(self.simulate_batch(inputs, psi, random_state))
@@ -2,6 +2,7 @@ r"""Utilities for the spatial SIR benchmark.
 
 """
 
+import numpy as np
 import torch
 
 from hypothesis.exception import IntractableException
@@ -29,6 +30,15 @@ def log_likelihood(theta, x):
     raise IntractableException
 
 
+def unpack(outputs, shape=(100, 100)):
+    r"""Converts packed simulator outputs to float lattices of the specified shape."""
+    if outputs.dtype == torch.uint8 and outputs.shape[-1] != shape[-1]:
+        outputs = np.unpackbits(outputs.cpu().numpy(), axis=-1, count=shape[-1])
+        outputs = torch.from_numpy(outputs)
+
+    return outputs.float()
+
+
 
 class Uniform(torch.distributions.uniform.Uniform):
 
@@ -0,0 +1,300 @@
+r"""Throughput benchmarks of the simulators and regression baselines.
+
+Every benchmark simulator is run at several batch sizes and numbers of
+workers. For every configuration the throughput (samples per second), the
+per-sample latency percentiles and the peak resident memory are recorded.
+The per-sample latencies are measured on a small sub-batch simulated row by
+row, the latencies of the batched calls only provide the spread of their
+per-call averages (``average_latency_percentiles``). Configurations which
+fail, crash or exceed their timeout are recorded as failed.
+The results of a run are stored as a JSON baseline, against which later runs
+are compared::
+
+    results = run(batch_sizes=[1, 64, 1024], workers=[1, 4])
+    save(results, "baseline.json")
+    ...
+    regressions = [r for r in compare(load("baseline.json"), run()) if r["regression"]]
+
+A command line interface is provided by ``hypothesis.bin.benchmark``.
+"""
+
+import hypothesis
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import queue as queues
+import resource
+import time
+import torch
+
+from hypothesis.simulation import InstrumentedSimulator
+from hypothesis.simulation import ParallelSimulator
+from hypothesis.simulation import SimulationProfiler
+
+
+
+BENCHMARKS = {
+    # Name: (module, keyword of the experimental design or None)
+    "biomoleculardocking": ("hypothesis.benchmark.biomoleculardocking", "experimental_configurations"),
+    "catapult": ("hypothesis.benchmark.catapult", "experimental_configurations"),
+    "death": ("hypothesis.benchmark.death", "experimental_configurations"),
+    "mg1": ("hypothesis.benchmark.mg1", None),
+    "normal": ("hypothesis.benchmark.normal", None), # Designs of the prior can be negative scales.
+    "seismic": ("hypothesis.benchmark.seismic", "experimental_configurations"),
+    "sir": ("hypothesis.benchmark.sir", "experimental_configurations"),
+    "spatialsir": ("hypothesis.benchmark.spatialsir", "experimental_configurations"),
+    "tractable": ("hypothesis.benchmark.tractable", None),
+    "weinberg": ("hypothesis.benchmark.weinberg", "experimental_configurations")}
+"""dict: The benchmarks covered by the suite."""
+
+
+def key(benchmark, batch_size, workers):
+    return "%s/batch_size=%d/workers=%d" % (benchmark, batch_size, workers)
+
+
+def sample_arguments(benchmark, batch_size):
+    r"""Draws the inputs (and designs) of a simulator call from the priors."""
+    module_name, design = BENCHMARKS[benchmark]
+    module = importlib.import_module(module_name)
+    n = torch.Size([batch_size])
+    arguments = {"inputs": module.Prior().sample(n).view(batch_size, -1)}
+    if design is not None:
+        arguments[design] = module.PriorExperiment().sample(n).view(batch_size, -1)
+
+    return arguments
+
+
+@torch.no_grad()
+def measure_latencies(benchmark, latency_samples=32):
+    r"""Percentiles of the latency of single rows, simulated one at a time."""
+    module = importlib.import_module(BENCHMARKS[benchmark][0])
+    profiler = SimulationProfiler()
+    simulator = InstrumentedSimulator(module.Simulator(), profiler, per_sample=True)
+    simulator(**sample_arguments(benchmark, 1))
+    profiler.reset()
+    simulator(**sample_arguments(benchmark, latency_samples))
+
+    return profiler.summary()["latency_percentiles"]
+
+
+@torch.no_grad()
+def measure(benchmark, batch_size, workers=1, repeats=3, min_time=1.0, latency_samples=32):
+    r"""Measures a single configuration in the current process.
+
+    The simulator is called once to warm up, after which it is called at
+    least ``repeats`` times and until ``min_time`` seconds have elapsed. The
+    per-sample latencies are measured afterwards, on ``latency_samples`` rows
+    simulated one at a time (0 disables the measurement).
+    """
+    module = importlib.import_module(BENCHMARKS[benchmark][0])
+    profiler = SimulationProfiler()
+    if workers > 1:
+        simulator = ParallelSimulator(module.Simulator(), workers=workers, persistent=True, profiler=profiler)
+    else:
+        simulator = InstrumentedSimulator(module.Simulator(), profiler)
+    with simulator:
+        simulator(**sample_arguments(benchmark, batch_size))
+        profiler.reset()
+        calls = 0
+        start = time.perf_counter()
+        while calls < repeats or time.perf_counter() - start < min_time:
+            arguments = sample_arguments(benchmark, batch_size)
+            simulator(**arguments)
+            calls += 1
+    summary = profiler.summary()
+    if latency_samples > 0:
+        latency_percentiles = measure_latencies(benchmark, latency_samples)
+    else:
+        latency_percentiles = {}
+    # Peak resident memory of this process and of the largest worker (in kilobytes on Linux).
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_worker_memory = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    return {
+        "benchmark": benchmark,
+        "batch_size": batch_size,
+        "workers": workers,
+        "calls": calls,
+        "samples_per_second": summary["samples_per_second"],
+        "latency_percentiles": latency_percentiles,
+        # Spread of the per-call (or per-chunk) averages of the latency.
+        "average_latency_percentiles": summary["latency_percentiles"],
+        "peak_memory": peak_memory * 1024,
+        "peak_worker_memory": peak_worker_memory * 1024 if workers > 1 else None}
+
+
+def _measure_isolated(queue, arguments):
+    torch.set_num_threads(1)
+    try:
+        queue.put((measure(**arguments), None))
+    except Exception as e:
+        queue.put((None, repr(e)))
+
+
+def measure_isolated(timeout=None, poll_interval=1.0, **arguments):
+    r"""Measures a configuration in a fresh process.
+
+    The peak memory of a configuration is therefore not affected by the
+    configurations measured before it. Raises a ``RuntimeError`` when the
+    measurement fails, when the process dies (e.g., killed by the kernel for
+    lack of memory) or when it exceeds ``timeout`` seconds.
+    """
+    name = key(arguments["benchmark"], arguments["batch_size"], arguments.get("workers", 1))
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure_isolated, args=(queue, arguments))
+    process.start()
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                result, exception = queue.get(timeout=poll_interval)
+                break
+            except queues.Empty:
+                pass
+            if process.exitcode is not None:
+                # The result may have been sent right before the process exited.
+                try:
+                    result, exception = queue.get(timeout=poll_interval)
+                    break
+                except queues.Empty:
+                    raise RuntimeError("Benchmark " + name + " failed: the process exited with code " + str(process.exitcode) + ".")
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise RuntimeError("Benchmark " + name + " failed: timeout after " + str(timeout) + " seconds.")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+    if exception is not None:
+        raise RuntimeError("Benchmark " + name + " failed: " + exception)
+
+    return result
+
+
+def run(benchmarks=None, batch_sizes=(1, 64, 1024), workers=(1, 4), repeats=3, min_time=1.0, isolate=True, show=False, latency_samples=32, timeout=None):
+    r"""Runs the benchmark suite.
+
+    A configuration which fails is recorded with the reason of its failure
+    under ``failed``, and the suite continues with the next configuration.
+
+    Args:
+        benchmarks (list): names of the benchmarks to run (default: all).
+        batch_sizes (list): batch sizes of the simulator calls.
+        workers (list): numbers of worker processes, 1 simulates in-process.
+        repeats (int): minimum number of timed calls per configuration.
+        min_time (float): minimum duration in seconds of a configuration.
+        isolate (bool): measure every configuration in a fresh process.
+        show (bool): print the results as they complete.
+        latency_samples (int): number of rows of which the latency is measured individually.
+        timeout (float): maximum duration in seconds of an isolated configuration (default: none).
+    """
+    if benchmarks is None:
+        benchmarks = sorted(BENCHMARKS.keys())
+    results = {}
+    for benchmark in benchmarks:
+        if benchmark not in BENCHMARKS:
+            raise ValueError("Unknown benchmark `" + benchmark + "`.")
+        for batch_size in batch_sizes:
+            for w in workers:
+                arguments = {
+                    "benchmark": benchmark,
+                    "batch_size": int(batch_size),
+                    "workers": int(w),
+                    "repeats": repeats,
+                    "min_time": min_time,
+                    "latency_samples": latency_samples}
+                try:
+                    if isolate:
+                        result = measure_isolated(timeout=timeout, **arguments)
+                    else:
+                        result = measure(**arguments)
+                except RuntimeError as e:
+                    result = {
+                        "benchmark": benchmark,
+                        "batch_size": int(batch_size),
+                        "workers": int(w),
+                        "failed": str(e)}
+                results[key(benchmark, batch_size, w)] = result
+                if show:
+                    print(format_result(result))
+
+    return {
+        "configuration": {
+            "batch_sizes": list(batch_sizes),
+            "workers": list(workers),
+            "repeats": repeats,
+            "min_time": min_time,
+            "isolate": isolate,
+            "latency_samples": latency_samples,
+            "latency": "latency_percentiles are measured on latency_samples rows simulated one at a time, "
+                "average_latency_percentiles are the spread of the per-call (or per-chunk) average latencies.",
+            "cpu_count": hypothesis.cpu_count,
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "time": time.time()},
+        "results": results}
+
+
+def format_result(result):
+    if "failed" in result:
+        return "%-50s FAILED  %s" % (key(result["benchmark"], result["batch_size"], result["workers"]), result["failed"])
+    p50 = result["latency_percentiles"].get("50")
+    p99 = result["latency_percentiles"].get("99")
+
+    return "%-50s %12.1f samples/s  p50 %.2e s  p99 %.2e s  peak %7.1f MB" % (
+        key(result["benchmark"], result["batch_size"], result["workers"]),
+        result["samples_per_second"],
+        p50 if p50 is not None else float("nan"),
+        p99 if p99 is not None else float("nan"),
+        result["peak_memory"] / 2 ** 20)
+
+
+def save(results, path):
+    with open(path + ".tmp", "w") as fd:
+        json.dump(results, fd, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load(path):
+    with open(path, "r") as fd:
+        return json.load(fd)
+
+
+def compare(baseline, results, tolerance=0.2, memory_tolerance=0.2):
+    r"""Compares a run against a baseline.
+
+    A configuration regresses when its throughput dropped by more than
+    ``tolerance``, when its peak memory grew by more than
+    ``memory_tolerance`` (relative to the baseline), or when it failed.
+    Configurations which are not part of both runs are ignored.
+
+    Returns a list with a comparison of every common configuration.
+    """
+    comparisons = []
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None or "failed" in reference:
+            continue
+        if "failed" in result:
+            comparisons.append({
+                "name": name,
+                "samples_per_second": 0.0,
+                "baseline_samples_per_second": reference["samples_per_second"],
+                "throughput_ratio": 0.0,
+                "memory_ratio": float("nan"),
+                "regression": True})
+            continue
+        throughput = result["samples_per_second"] / max(reference["samples_per_second"], 1e-12)
+        memory = result["peak_memory"] / max(reference["peak_memory"], 1)
+        comparisons.append({
+            "name": name,
+            "samples_per_second": result["samples_per_second"],
+            "baseline_samples_per_second": reference["samples_per_second"],
+            "throughput_ratio": throughput,
+            "memory_ratio": memory,
+            "regression": throughput < 1 - tolerance or memory > 1 + memory_tolerance})
+
+    return comparisons
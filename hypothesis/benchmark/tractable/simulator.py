@@ -1,11 +1,12 @@
 import torch
 
-from hypothesis.simulation import Simulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator
 from torch.distributions.multivariate_normal import MultivariateNormal as Normal
 
 
 
-class TractableSimulator(Simulator):
+class TractableSimulator(SeededSimulator):
     r"""
 
     Todo:
@@ -29,12 +30,25 @@ class TractableSimulator(Simulator):
 
         return x_out
 
-    def forward(self, inputs):
+    def simulate_batch(self, inputs, random_state=None):
+        r"""Draws the 4 samples of every row of the batch together.
+
+        The samples are drawn through the closed form Cholesky factor of the
+        2x2 covariance matrix of every row.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        inputs = inputs.view(-1, 5)
+        n = inputs.shape[0]
+        s_1 = inputs[:, 2] ** 2
+        s_2 = inputs[:, 3] ** 2
+        rho = inputs[:, 4].tanh()
+        z = random_state.normal((n, 4, 2), dtype=inputs.dtype, device=inputs.device)
+        x_1 = inputs[:, 0:1] + s_1.view(-1, 1) * z[:, :, 0]
+        x_2 = inputs[:, 1:2] + s_2.view(-1, 1) * (rho.view(-1, 1) * z[:, :, 0] + (1 - rho ** 2).sqrt().view(-1, 1) * z[:, :, 1])
+
+        return torch.stack([x_1, x_2], dim=2).view(n, -1)
+
+    def forward(self, inputs, random_state=None):
         r""""""
-        samples = []
-
-        for input in inputs:
-            x_out = self._generate(input)
-            samples.append(x_out.view(1, -1))
-
-        return torch.cat(samples, dim=0)
+        return self.simulate_batch(inputs, random_state)
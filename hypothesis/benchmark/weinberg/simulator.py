@@ -15,7 +15,8 @@ import hypothesis
 import numpy as np
 import torch
 
-from hypothesis.simulation import Simulator as BaseSimulator
+from hypothesis.simulation.seed import RandomState
+from hypothesis.simulation.seed import SeededSimulator as BaseSimulator
 
 
 
@@ -41,40 +42,59 @@ class WeinbergSimulator(BaseSimulator):
 
         return ((1 + costheta**2) + self._a_fb(sqrtshalf, gf) * costheta) / norm
 
+    def _envelope(self, sqrtshalf, gf):
+        # The differential cross section is convex in the cosine of the
+        # angle, its maximum over [-1, 1] is therefore attained at -1 or 1.
+        return np.maximum(self._diffxsec(-1.0, sqrtshalf, gf), self._diffxsec(1.0, sqrtshalf, gf))
+
+    def simulate_batch(self, theta, psi, block=4, random_state=None):
+        r"""Rejection sampling of ``num_samples`` angles for every ``(theta, psi)`` pair.
+
+        The envelope is computed once per pair. Every round draws ``block``
+        proposals for all outstanding samples at once, and keeps the first
+        accepted proposal of every sample. The proposals are drawn for all
+        samples of the rows with an outstanding sample, such that a row only
+        depends on its own stream.
+        """
+        if random_state is None:
+            random_state = RandomState()
+        theta = np.asarray(theta, dtype=np.float64).reshape(-1, 1)
+        psi = np.asarray(psi, dtype=np.float64).reshape(-1, 1)
+        theta, psi = np.broadcast_arrays(theta, psi)
+        n = theta.shape[0]
+        maxval = self._envelope(psi, theta)
+        samples = np.empty((n, self.num_samples))
+        rows, columns = np.nonzero(np.ones((n, self.num_samples), dtype=bool))
+        while len(rows) > 0:
+            m = len(rows)
+            outstanding, index = np.unique(rows, return_inverse=True)
+            shape = (len(outstanding), self.num_samples, block)
+            outstanding = torch.from_numpy(outstanding)
+            xprop = random_state.uniform(shape, rows=outstanding, dtype=torch.float64).cpu().numpy()
+            xprop = 2 * xprop[index, columns] - 1
+            ycut = random_state.uniform(shape, rows=outstanding, dtype=torch.float64).cpu().numpy()
+            ycut = ycut[index, columns]
+            yprop = self._diffxsec(xprop, psi[rows], theta[rows]) / maxval[rows]
+            accepted = yprop / maxval[rows] >= ycut
+            first = np.argmax(accepted, axis=1)
+            done = accepted[np.arange(m), first]
+            samples[rows[done], columns[done]] = xprop[done, first[done]]
+            rows = rows[~done]
+            columns = columns[~done]
+
+        return torch.from_numpy(samples).float()
+
     def simulate(self, theta, psi):
         # theta = gf
         # psi = sqrtshalf
-        samples = []
-
-        for _ in range(self.num_samples):
-            sample = None
-            x = np.linspace(-1, 1, 10000)
-            maxval = np.max(self._diffxsec(x, psi, theta))
-            while sample is None:
-                xprop = np.random.uniform(-1, 1)
-                ycut = np.random.random()
-                yprop = self._diffxsec(xprop, psi, theta) / maxval
-                if yprop / maxval < ycut:
-                    continue
-                sample = xprop
-            sample = torch.tensor(sample).view(1, 1)
-            samples.append(sample)
-
-        return torch.cat(samples, dim=1)
+        return self.simulate_batch(theta, psi)
 
     @torch.no_grad()
-    def forward(self, inputs, experimental_configurations=None):
-        outputs = []
-
-        n = len(inputs)
-        for index in range(n):
-            theta = inputs[index]
-            if experimental_configurations is not None:
-                psi = experimental_configurations[index]
-                x = self.simulate(theta.item(), psi.item())
-            else:
-                x = self.simulate(theta.item(), self.default_beam_energy)
-            outputs.append(x)
-        outputs = torch.cat(outputs, dim=0)
-
-        return outputs
+    def forward(self, inputs, experimental_configurations=None, random_state=None):
+        theta = inputs.detach().cpu().double().view(-1).numpy()
+        if experimental_configurations is not None:
+            psi = experimental_configurations.detach().cpu().double().view(-1).numpy()
+        else:
+            psi = np.full(len(theta), self.default_beam_energy)
+
+        return self.simulate_batch(theta, psi, random_state=random_state)
@@ -0,0 +1,74 @@
+r"""A utility program to benchmark the throughput of the simulators.
+
+Records a baseline::
+
+    python -m hypothesis.bin.benchmark --batch-sizes 1 64 1024 --workers 1 4 --out baseline.json
+
+Compares a run against the baseline, the program exits with a non-zero
+status when a configuration regressed or failed::
+
+    python -m hypothesis.bin.benchmark --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import hypothesis
+import sys
+
+from hypothesis.benchmark import throughput
+
+
+
+def main(arguments):
+    results = throughput.run(
+        benchmarks=arguments.benchmarks,
+        batch_sizes=arguments.batch_sizes,
+        workers=arguments.workers,
+        repeats=arguments.repeats,
+        min_time=arguments.min_time,
+        isolate=not arguments.no_isolate,
+        show=True,
+        latency_samples=arguments.latency_samples,
+        timeout=arguments.timeout)
+    if arguments.out is not None:
+        throughput.save(results, arguments.out)
+    failures = sum(int("failed" in result) for result in results["results"].values())
+    if arguments.baseline is None:
+        return int(failures > 0)
+    comparisons = throughput.compare(throughput.load(arguments.baseline), results,
+        tolerance=arguments.tolerance,
+        memory_tolerance=arguments.memory_tolerance)
+    regressions = 0
+    for comparison in comparisons:
+        regressions += int(comparison["regression"])
+        print("%-50s throughput x%.2f  memory x%.2f%s" % (
+            comparison["name"],
+            comparison["throughput_ratio"],
+            comparison["memory_ratio"],
+            "  REGRESSION" if comparison["regression"] else ""))
+    print(regressions, "regression(s) in", len(comparisons), "configuration(s).")
+
+    return int(regressions > 0 or failures > 0)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser("Benchmark: simulator throughput and regression baselines.")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline to compare the run against (default: none).")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024], help="Batch sizes of the simulator calls (default: 1 64 1024).")
+    parser.add_argument("--benchmarks", type=str, nargs="+", default=None, help="Benchmarks to run (default: all).")
+    parser.add_argument("--latency-samples", type=int, default=32, help="Number of rows of which the latency is measured individually (default: 32).")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="Allowed relative increase of the peak memory (default: 0.2).")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Minimum duration in seconds of every configuration (default: 1.0).")
+    parser.add_argument("--no-isolate", action="store_true", help="Measure all configurations in this process (default: false).")
+    parser.add_argument("--out", type=str, default=None, help="Path of the JSON file to store the results in (default: none).")
+    parser.add_argument("--repeats", type=int, default=3, help="Minimum number of timed calls of every configuration (default: 3).")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum duration in seconds of an isolated configuration (default: none).")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative decrease of the throughput (default: 0.2).")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, min(4, hypothesis.cpu_count)], help="Numbers of worker processes (default: 1 and up to 4).")
+    arguments, _ = parser.parse_known_args()
+
+    return arguments
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    sys.exit(main(arguments))
@@ -0,0 +1,195 @@
+r"""A utility program to generate large simulated datasets.
+
+The dataset is generated in shards, which are simulated in parallel and
+streamed to ``.npy`` files. Completed shards are registered in a manifest,
+such that an interrupted run resumes from the completed shards::
+
+    python -m hypothesis.bin.simulate \
+        --simulator hypothesis.benchmark.sir.Simulator \
+        --prior hypothesis.benchmark.sir.Prior \
+        --n 100000000 --shard-size 100000 --workers 32 --out data
+
+Every shard is simulated under its own seed derived from ``--seed`` (see
+``hypothesis.simulation.seed``), the dataset is therefore reproducible
+regardless of the number of workers or interruptions. The shards can be
+stitched together with ``hypothesis.bin.io.merge``.
+"""
+
+import argparse
+import hypothesis
+import json
+import numpy as np
+import os
+import signal
+import time
+import torch
+
+from hypothesis.simulation.seed import derive_seeds
+from hypothesis.simulation.seed import fork_rng
+from multiprocessing import Pool
+
+
+
+MANIFEST = "manifest.json"
+
+
+def main(arguments):
+    manifest = load_manifest(arguments)
+    completed = set(shard["index"] for shard in manifest["shards"])
+    num_shards = -(-arguments.n // arguments.shard_size)
+    pending = [index for index in range(num_shards) if index not in completed]
+    if arguments.show:
+        print("Completed shards:", len(completed), "/", num_shards)
+    if len(pending) == 0:
+        return
+    seeds = derive_seeds(arguments.seed, num_shards)
+    tasks = []
+    for index in pending:
+        rows = min(arguments.shard_size, arguments.n - index * arguments.shard_size)
+        tasks.append((index, rows, int(seeds[index])))
+    start = time.time()
+    pool = Pool(processes=arguments.workers, initializer=initialize_worker, initargs=(arguments,))
+    try:
+        for shard in pool.imap_unordered(simulate_shard, tasks):
+            manifest["shards"].append(shard)
+            manifest["shards"].sort(key=lambda s: s["index"])
+            save_manifest(arguments, manifest)
+            if arguments.show:
+                print("Shard", shard["index"], "completed,",
+                    len(manifest["shards"]), "/", num_shards,
+                    "(%.1f seconds)" % (time.time() - start))
+    except BaseException:
+        # Stop the pending shards, the run is resumed from the manifest.
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def configuration(arguments):
+    return {
+        "n": arguments.n,
+        "prior": arguments.prior,
+        "prior_experiment": arguments.prior_experiment,
+        "seed": arguments.seed,
+        "shard_size": arguments.shard_size,
+        "simulator": arguments.simulator}
+
+
+def load_manifest(arguments):
+    path = os.path.join(arguments.out, MANIFEST)
+    # Check if a previous run needs to be resumed.
+    if not os.path.exists(path):
+        return {"configuration": configuration(arguments), "shards": []}
+    with open(path, "r") as fd:
+        manifest = json.load(fd)
+    if manifest["configuration"] != configuration(arguments):
+        raise ValueError("The configuration does not match the manifest in", arguments.out)
+    # Only keep the shards of which all files are still available.
+    shards = []
+    for shard in manifest["shards"]:
+        if all(os.path.exists(os.path.join(arguments.out, f)) for f in shard["files"].values()):
+            shards.append(shard)
+    manifest["shards"] = shards
+
+    return manifest
+
+
+def save_manifest(arguments, manifest):
+    path = os.path.join(arguments.out, MANIFEST)
+    with open(path + ".tmp", "w") as fd:
+        json.dump(manifest, fd, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def save(arguments, name, index, data):
+    file_name = "%s-%06d.npy" % (name, index)
+    path = os.path.join(arguments.out, file_name)
+    # Write to a temporary file first, an interrupted write leaves no shard.
+    with open(path + ".tmp", "wb") as fd:
+        np.save(fd, data)
+    os.replace(path + ".tmp", path)
+
+    return file_name
+
+
+_worker = None # Simulator and priors of the worker process.
+
+
+def initialize_worker(arguments):
+    global _worker
+    # Interruptions are handled by the parent process, which terminates the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    torch.set_num_threads(1)
+    simulator = load_class(arguments.simulator)()
+    prior = load_class(arguments.prior)()
+    if arguments.prior_experiment is not None:
+        prior_experiment = load_class(arguments.prior_experiment)()
+    else:
+        prior_experiment = None
+    _worker = (arguments, simulator, prior, prior_experiment)
+
+
+@torch.no_grad()
+def simulate_shard(task):
+    index, rows, seed = task
+    arguments, simulator, prior, prior_experiment = _worker
+    files = {}
+    with fork_rng(seed):
+        inputs = prior.sample(torch.Size([rows])).view(rows, -1)
+        if prior_experiment is not None:
+            designs = prior_experiment.sample(torch.Size([rows])).view(rows, -1)
+            outputs = simulator(inputs, experimental_configurations=designs)
+            files["designs"] = save(arguments, "designs", index, designs.cpu().numpy())
+        else:
+            outputs = simulator(inputs)
+    files["inputs"] = save(arguments, "inputs", index, inputs.cpu().numpy())
+    files["outputs"] = save(arguments, "outputs", index, outputs.cpu().numpy())
+
+    return {"index": index, "rows": rows, "seed": seed, "files": files}
+
+
+def load_class(full_classname):
+    if full_classname is None:
+        raise ValueError("The specified classname cannot be `None`.")
+    module_name, class_name = full_classname.rsplit('.', 1)
+    module = __import__(module_name, fromlist=[class_name])
+
+    return getattr(module, class_name)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser("Simulate: generating sharded simulation datasets in parallel.")
+    parser.add_argument("--n", type=int, default=None, help="Total number of simulations (default: none).")
+    parser.add_argument("--out", type=str, default=None, help="Output directory of the shards and the manifest (default: none).")
+    parser.add_argument("--prior", type=str, default=None, help="Full classname of the prior (default: none).")
+    parser.add_argument("--prior-experiment", type=str, default=None, help="Full classname of the prior over the experimental configurations (default: none, optional).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed from which the seeds of the shards are derived (default: 0).")
+    parser.add_argument("--shard-size", type=int, default=100000, help="Number of simulations per shard (default: 100000).")
+    parser.add_argument("--show", action="store_true", help="Show the progress (default: false).")
+    parser.add_argument("--simulator", type=str, default=None, help="Full classname of the simulator (default: none).")
+    parser.add_argument("--workers", type=int, default=hypothesis.workers, help="Number of concurrent simulation processes (default: number of cores).")
+    arguments, _ = parser.parse_known_args()
+    # Check if a simulator has been specified.
+    if arguments.simulator is None:
+        raise ValueError("No simulator has been specified.")
+    # Check if a prior has been specified.
+    if arguments.prior is None:
+        raise ValueError("No prior has been specified.")
+    # Check if the number of simulations has been specified.
+    if arguments.n is None or arguments.n < 1:
+        raise ValueError("The number of simulations has not been specified.")
+    # Check if an output directory has been specified.
+    if arguments.out is None:
+        raise ValueError("No output directory has been specified.")
+    if not os.path.exists(arguments.out):
+        os.makedirs(arguments.out)
+
+    return arguments
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    main(arguments)
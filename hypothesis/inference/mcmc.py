@@ -2,130 +2,248 @@ r"""Markov chain Monte Carlo methods for inference.
 """
 
 import hypothesis
-import numpy as np
 import torch
 
 from hypothesis.engine import Procedure
 from hypothesis.summary.mcmc import Chain
-from torch.distributions.multivariate_normal import MultivariateNormal
-from torch.distributions.normal import Normal
 from torch.multiprocessing import Pool
 
 
 
 class ParallelSampler:
+    r"""Samples several Markov chains of a sampler.
 
-    def __init__(self, sampler, chains=2, workers=torch.multiprocessing.cpu_count()):
+    The chains are advanced together as a single batch by the batched engine
+    of the sampler (see ``MarkovChainMonteCarlo.sample_chains``). When more
+    than one worker is specified, the chains are divided over the worker
+    processes, every worker advancing its chains as a batch.
+    """
+
+    def __init__(self, sampler, chains=2, workers=1):
         self.chains = chains
         self.sampler = sampler
         self.workers = workers
 
-    def _prepare_arguments(self, observations, thetas, num_samples):
+    def _prepare_arguments(self, observations, inputs, num_samples):
         arguments = []
-        for input in inputs:
-            arguments.append(self.sampler, observations, input, num_samples)
+        # Every worker requires its own random state.
+        seeds = torch.randint(0, 2 ** 62, (self.workers,)).tolist()
+        for seed, group in zip(seeds, inputs.chunk(self.workers)):
+            arguments.append((self.sampler, observations, group, num_samples, seed))
 
         return arguments
 
     def _prepare_inputs(self):
-        inputs = []
         prior = self.sampler.prior
-        for _ in range(self.chains):
-            inputs.append(prior.sample())
 
-        return inputs
+        return prior.sample(torch.Size([self.chains])).view(self.chains, -1)
 
     @torch.no_grad()
     def sample(self, observations, num_samples, thetas=None):
-        assert(thetas is None or len(thetas) is self.chains)
+        assert(thetas is None or len(thetas) == self.chains)
         self.sampler.reset()
         if thetas is None:
             inputs = self._prepare_inputs()
+        else:
+            inputs = torch.stack([theta.view(-1) for theta in thetas])
+        if self.workers <= 1:
+            return self.sampler.sample_chains(observations, inputs, num_samples)
         pool = Pool(processes=self.workers)
-        arguments = self._prepare_arguments(observations, inputs, num_samples)
-        chains = pool.map(self.sample_chain, arguments)
-        del pool
+        try:
+            arguments = self._prepare_arguments(observations, inputs, num_samples)
+            groups = pool.map(self.sample_chain, arguments)
+        finally:
+            pool.close()
+            pool.join()
+            del pool
 
-        return chains
+        return [chain for chains in groups for chain in chains]
 
     @staticmethod
     def sample_chain(arguments):
-        sampler, observations, input, num_samples = arguments
-        chain = sampler.sample(observations, input, num_samples)
+        sampler, observations, inputs, num_samples, seed = arguments
+        torch.manual_seed(seed)
+        chains = sampler.sample_chains(observations, inputs, num_samples)
 
-        return chain
+        return chains
 
 
 
 class MarkovChainMonteCarlo(Procedure):
-    r""""""
+    r"""Batched Metropolis-Hastings engine.
+
+    The chains are advanced as a ``(chains, dimensionality)`` tensor. The
+    samples, acceptance probabilities and acceptances are written into
+    preallocated tensors, and the uniforms (and the proposal noise of
+    additive transitions) are drawn in blocks of ``block_size`` steps. The
+    acceptance decisions stay on the device of the chains, such that the
+    loop does not synchronize with the host. After every step, the states
+    of the chains and their acceptance probabilities are passed to
+    ``transition.adapt``, through which adaptive transitions tune their
+    proposal.
+
+    With ``num_proposals`` larger than 1, every step proposes that many
+    candidates per chain, which are scored in a single evaluation of the
+    likelihood (or ratio estimator). The candidates are drawn around an
+    auxiliary point proposed from the current state, and the next state is
+    selected among the current state and the candidates proportionally to
+    their posterior density (Calderhead, 2014, https://arxiv.org/abs/1311.1145).
+    This requires a symmetrical transition.
+    """
 
-    def __init__(self, prior):
+    def __init__(self, prior, transition=None, block_size=256, num_proposals=1):
         super(MarkovChainMonteCarlo, self).__init__()
+        if num_proposals < 1:
+            raise ValueError("At least one proposal per step is required.")
+        self.block_size = int(block_size)
+        self.num_proposals = int(num_proposals)
         self.prior = prior
+        self.transition = transition
 
     def _register_events(self):
         pass # No events to register.
 
-    def _step(self, theta, observations):
+    def _log_likelihoods(self, inputs, observations):
         raise NotImplementedError
 
+    def _log_prior(self, inputs):
+        r"""Log prior probability of every row of ``inputs``."""
+        log_probabilities = self.prior.log_prob(inputs)
+        # Priors reducing over the batch are evaluated for every row.
+        if log_probabilities.dim() == 0 and len(inputs) > 1:
+            log_probabilities = torch.stack([self.prior.log_prob(input.view(1, -1)) for input in inputs])
+
+        return log_probabilities.view(len(inputs), -1).sum(dim=1).to(inputs.device)
+
+    def _log_targets(self, inputs, observations):
+        return self._log_prior(inputs) + self._log_likelihoods(inputs, observations)
+
+    def _propose(self, inputs, perturbations):
+        if perturbations is not None:
+            return inputs + perturbations
+
+        return self.transition.sample(inputs).view_as(inputs)
+
     def reset(self):
         pass
 
+    def _run(self, observations, inputs, samples, acceptance_probabilities, acceptances):
+        num_chains, num_samples = acceptances.shape
+        device = inputs.device
+        denominators = self._log_targets(inputs, observations)
+        for block_start in range(0, num_samples, self.block_size):
+            block = min(self.block_size, num_samples - block_start)
+            log_uniforms = torch.rand(block, num_chains, device=device).log()
+            perturbations = self.transition.perturbations(inputs, block)
+            for index in range(block):
+                step = block_start + index
+                inputs_next = self._propose(inputs, None if perturbations is None else perturbations[index])
+                numerators = self._log_targets(inputs_next, observations)
+                log_ratios = numerators - denominators
+                accepted = log_uniforms[index] <= log_ratios
+                inputs = torch.where(accepted.view(-1, 1), inputs_next, inputs)
+                denominators = torch.where(accepted, numerators, denominators)
+                samples[:, step] = inputs
+                acceptance_probabilities[:, step] = log_ratios.exp().clamp(max=1)
+                acceptances[:, step] = accepted
+                self.transition.adapt(inputs, acceptance_probabilities[:, step])
+
+    def _run_multiple_proposals(self, observations, inputs, samples, acceptance_probabilities, acceptances):
+        r"""Advances the chains with ``num_proposals`` candidates per step.
+
+        The candidates of all chains are stacked as ``num_proposals`` blocks
+        of ``(chains, dimensionality)``, and are scored in a single call of
+        ``_log_targets``. The selection of the next state is a Gumbel-max
+        draw over the log targets of the current state and the candidates.
+        """
+        num_chains, num_samples = acceptances.shape
+        num_proposals = self.num_proposals
+        device = inputs.device
+        log_targets = self._log_targets(inputs, observations)
+        for block_start in range(0, num_samples, self.block_size):
+            block = min(self.block_size, num_samples - block_start)
+            gumbels = -(-torch.rand(block, num_chains, num_proposals + 1, device=device).log()).log()
+            # Perturbations of the auxiliary point (first) and of the candidates around it.
+            perturbations = self.transition.perturbations(inputs, block * (num_proposals + 1))
+            if perturbations is not None:
+                perturbations = perturbations.view((block, num_proposals + 1) + inputs.shape)
+            for index in range(block):
+                step = block_start + index
+                if perturbations is not None:
+                    auxiliary = self._propose(inputs, perturbations[index, 0])
+                    candidates = self._propose(auxiliary.repeat(num_proposals, 1),
+                        perturbations[index, 1:].reshape(-1, inputs.shape[1]))
+                else:
+                    auxiliary = self._propose(inputs, None)
+                    candidates = self._propose(auxiliary.repeat(num_proposals, 1), None)
+                candidates = candidates.view((num_proposals,) + inputs.shape)
+                candidate_log_targets = self._log_targets(candidates.view(-1, inputs.shape[1]), observations)
+                # Index 0 is the current state, the candidates follow.
+                weights = torch.cat([log_targets.view(-1, 1), candidate_log_targets.view(num_proposals, num_chains).t()], dim=1)
+                selected = (weights + gumbels[index]).argmax(dim=1)
+                states = torch.cat([inputs.unsqueeze(0), candidates], dim=0)
+                inputs = states[selected, torch.arange(num_chains, device=device)]
+                log_targets = weights.gather(1, selected.view(-1, 1)).view(-1)
+                samples[:, step] = inputs
+                acceptance_probabilities[:, step] = 1 - weights.softmax(dim=1)[:, 0]
+                acceptances[:, step] = selected != 0
+                self.transition.adapt(inputs, acceptance_probabilities[:, step])
+
+    @torch.no_grad()
+    def sample_chains(self, observations, inputs, num_samples):
+        r"""Samples a Markov chain from every row of ``inputs``.
+
+        All chains are advanced together as a ``(chains, dimensionality)``
+        tensor. The log-likelihood (or log ratio) is therefore evaluated for
+        all chains in a single call, and should return a log-likelihood for
+        every row of its inputs.
+
+        Returns a list with the ``Chain`` of every row.
+        """
+        if not self.transition.is_symmetrical():
+            raise NotImplementedError
+        inputs = inputs.view(len(inputs), -1)
+        num_chains = len(inputs)
+        device = inputs.device
+        samples = inputs.new_empty((num_chains, num_samples) + inputs.shape[1:])
+        acceptance_probabilities = torch.empty(num_chains, num_samples, device=device)
+        acceptances = torch.empty(num_chains, num_samples, dtype=torch.bool, device=device)
+        if self.num_proposals > 1:
+            run = self._run_multiple_proposals
+        else:
+            run = self._run
+        run(observations, inputs, samples, acceptance_probabilities, acceptances)
+        samples = samples.cpu()
+        acceptance_probabilities = acceptance_probabilities.cpu()
+        acceptances = acceptances.cpu()
+        chains = []
+        for index in range(num_chains):
+            chains.append(Chain(samples[index], acceptance_probabilities[index], acceptances[index]))
+
+        return chains
+
     @torch.no_grad()
     def sample(self, observations, input, num_samples):
         r""""""
-        acceptance_probabilities = []
-        acceptances = []
-        samples = []
         self.reset()
-        input = input.view(1, -1)
-        for sample_index in range(num_samples):
-            input, acceptance_probability, acceptance = self._step(input, observations)
-            input = input.view(1, -1)
-            samples.append(input)
-            acceptance_probabilities.append(acceptance_probability)
-            acceptances.append(acceptance)
-        samples = torch.cat(samples, dim=0)
-        chain = Chain(samples, acceptance_probabilities, acceptances)
 
-        return chain
+        return self.sample_chains(observations, input.view(1, -1), num_samples)[0]
 
 
 
 class MetropolisHastings(MarkovChainMonteCarlo):
     r""""""
 
-    def __init__(self, prior, log_likelihood, transition):
-        super(MetropolisHastings, self).__init__(prior)
-        self.denominator = None
+    def __init__(self, prior, log_likelihood, transition, block_size=256, num_proposals=1):
+        super(MetropolisHastings, self).__init__(prior, transition, block_size, num_proposals)
         self.log_likelihood = log_likelihood
-        self.transition = transition
-
-    def _step(self, input, observations):
-        accepted = False
-
-        input_next = self.transition.sample(input)
-        lnl_input_next = self.log_likelihood(input_next, observations)
-        numerator = self.prior.log_prob(input_next) + lnl_input_next
-        if self.denominator is None:
-            lnl_input = self.log_likelihood(input, observations)
-            self.denominator = self.prior.log_prob(input) + lnl_input
-        acceptance_ratio = (numerator - self.denominator)
-        if not self.transition.is_symmetrical():
-            raise NotImplementedError
-        acceptance_probability = min([1, acceptance_ratio.exp().item()])
-        u = np.random.uniform()
-        if u <= acceptance_probability:
-            accepted = True
-            input = input_next
-            self.denominator = numerator
 
-        return input, acceptance_probability, accepted
+    def _log_likelihoods(self, inputs, observations):
+        log_likelihoods = self.log_likelihood(inputs, observations).view(-1)
+        if len(log_likelihoods) != len(inputs):
+            raise ValueError("The log-likelihood should be evaluated for every row of the inputs.")
 
-    def reset(self):
-        self.denominator = None
+        return log_likelihoods
 
 
 
@@ -135,50 +253,43 @@ class AALRMetropolisHastings(MarkovChainMonteCarlo):
     https://arxiv.org/abs/1903.04057
     """
 
-    def __init__(self, prior, ratio_estimator, transition):
-        super(AALRMetropolisHastings, self).__init__(prior)
-        self.denominator = None
-        self.prior = prior
+    def __init__(self, prior, ratio_estimator, transition, block_size=256, num_proposals=1):
+        super(AALRMetropolisHastings, self).__init__(prior, transition, block_size, num_proposals)
         self.ratio_estimator = ratio_estimator
-        self.transition = transition
-
-    def _compute_ratio(self, input, outputs):
-        num_observations = outputs.shape[0]
-        inputs = input.repeat(num_observations, 1)
-        inputs = inputs.to(hypothesis.accelerator)
-        _, log_ratios = self.ratio_estimator(inputs=inputs, outputs=outputs)
-
-        return log_ratios.sum().cpu()
-
-    def _step(self, input, observations):
-        accepted = False
-
-        with torch.no_grad():
-            input_next = self.transition.sample(input)
-            lnl_input_next = self._compute_ratio(input_next, observations)
-            numerator = self.prior.log_prob(input_next) + lnl_input_next
-            if self.denominator is None:
-                lnl_input = self._compute_ratio(input, observations)
-                self.denominator = self.prior.log_prob(input) + lnl_input
-            acceptance_ratio = (numerator - self.denominator)
-            if not self.transition.is_symmetrical():
-                raise NotImplementedError
-            acceptance_probability = min([1, acceptance_ratio.exp().item()])
-            u = np.random.uniform()
-            if u <= acceptance_probability:
-                accepted = True
-                input = input_next
-                self.denominator = numerator
-
-        return input, acceptance_probability, accepted
 
-    def reset(self):
-        self.denominator = None
+    def _embed(self, outputs):
+        embed = getattr(self.ratio_estimator, "embed_outputs", None)
+        if embed is None:
+            return outputs
+
+        return embed(outputs)
+
+    def _log_likelihoods(self, inputs, embeddings):
+        r"""Sum of the log ratios of the observations, for every row of ``inputs``.
+
+        The observations have been embedded once by the ratio estimator (if
+        it supports it), only the part depending on the inputs is evaluated.
+        All pairs of inputs and observations are evaluated in a single
+        forward pass.
+        """
+        num_inputs = inputs.shape[0]
+        num_observations = embeddings.shape[0]
+        device = inputs.device
+        inputs = inputs.to(hypothesis.accelerator).repeat_interleave(num_observations, dim=0)
+        embeddings = embeddings.repeat(num_inputs, *([1] * (embeddings.dim() - 1)))
+        log_ratio = getattr(self.ratio_estimator, "log_ratio_embedded", None)
+        if log_ratio is not None:
+            log_ratios = log_ratio(inputs, embeddings)
+        else:
+            _, log_ratios = self.ratio_estimator(inputs=inputs, outputs=embeddings)
+
+        return log_ratios.view(num_inputs, num_observations).sum(dim=1).to(device)
 
     @torch.no_grad()
-    def sample(self, outputs, input, num_samples):
+    def sample_chains(self, outputs, inputs, num_samples):
         assert(not self.ratio_estimator.training)
-        outputs = outputs.to(hypothesis.accelerator)
-        chain = super(AALRMetropolisHastings, self).sample(outputs, input, num_samples)
+        # Embed the observations once for all steps.
+        embeddings = self._embed(outputs.to(hypothesis.accelerator))
+        chains = super(AALRMetropolisHastings, self).sample_chains(embeddings, inputs, num_samples)
 
-        return chain
+        return chains
@@ -1,6 +1,5 @@
 r""""""
 
-import hypothesis
 import numpy as np
 import torch
 
@@ -19,6 +18,24 @@ class Transition:
     def sample(self, xs, samples=1):
         raise NotImplementedError
 
+    def perturbations(self, xs, num_steps):
+        r"""Draws the perturbations of ``num_steps`` proposals from ``xs``.
+
+        Transitions which propose ``xs`` plus independent noise return the
+        noise of every step, of shape ``(num_steps,) + xs.shape``, such
+        that it can be drawn in advance. Other transitions return ``None``.
+        """
+        return None
+
+    def adapt(self, xs, acceptance_probabilities):
+        r"""Observes the states ``xs`` of the chains after a step.
+
+        Called by the MCMC engine after every step with the states of all
+        chains and their acceptance probabilities. Adaptive transitions tune
+        their proposal from these, the others ignore them.
+        """
+        pass
+
     def is_symmetrical(self):
         raise NotImplementedError
 
@@ -54,12 +71,14 @@ class Normal(SymmetricalTransition):
     def sample(self, means, samples=1):
         with torch.no_grad():
             means = means.view(-1, 1)
-            normal_samples = torch.randn(means.size(0), samples)
-            normal_samples = normal_samples.to(hypothesis.accelerator)
+            normal_samples = torch.randn(means.size(0), samples, device=means.device)
             samples = (normal_samples * self.sigma) + means
 
         return samples
 
+    def perturbations(self, xs, num_steps):
+        return torch.randn((num_steps,) + xs.shape, device=xs.device) * self.sigma
+
 
 class MultivariateNormal(SymmetricalTransition):
 
@@ -74,14 +93,129 @@ class MultivariateNormal(SymmetricalTransition):
         return normal.log_prob(conditionals)
 
     def sample(self, means, samples=1):
-        x = []
+        with torch.no_grad():
+            means = means.view(-1, 1, self.dimensionality)
+            normal = MultivariateNormalDistribution(torch.zeros_like(self.sigma[0]), self.sigma)
+            x = means + normal.sample(torch.Size([means.size(0), samples]))
+            x = x.squeeze()
+
+        return x
 
+    def perturbations(self, xs, num_steps):
+        xs = xs.view(-1, self.dimensionality)
+        normal = MultivariateNormalDistribution(torch.zeros_like(self.sigma[0]), self.sigma)
+
+        return normal.sample(torch.Size([num_steps, xs.size(0)])).to(xs.device)
+
+
+
+class AdaptiveMultivariateNormal(SymmetricalTransition):
+    r"""Multivariate normal transition with an adaptive covariance.
+
+    The covariance of the proposal is ``scale * covariance``, where
+    ``covariance`` is the covariance of the chain history, scaled by
+    ``2.38^2 / dimensionality`` (Haario et al., 2001). The covariance is
+    estimated online with Welford's algorithm, pooling the states of all
+    chains, and is replaced by ``sigma`` until ``min_samples`` states have
+    been observed. The scale is tuned by stochastic approximation towards
+    ``target_acceptance_rate``, with step sizes ``step ** -decay`` such that
+    the adaptation diminishes (Andrieu and Thoms, 2008). The adaptation
+    stops after ``adaptation_steps`` steps (default: never).
+
+    Args:
+        sigma (Tensor): initial covariance matrix of the proposal.
+        target_acceptance_rate (float): targeted acceptance rate.
+        min_samples (int): number of observed states before the covariance of the history is used.
+        adaptation_steps (int): number of adapted steps, ``None`` to always adapt.
+        decay (float): decay of the step sizes, in ``(0.5, 1]``.
+        epsilon (float): regularization of the diagonal of the covariance.
+    """
+
+    def __init__(self, sigma,
+        target_acceptance_rate=0.234,
+        min_samples=None,
+        adaptation_steps=None,
+        decay=0.6,
+        epsilon=1e-6):
+        super(AdaptiveMultivariateNormal, self).__init__()
+        self.sigma = sigma
+        self.dimensionality = sigma.size(0)
+        if min_samples is None:
+            min_samples = 2 * (self.dimensionality + 1)
+        self.adaptation_steps = adaptation_steps
+        self.decay = decay
+        self.epsilon = epsilon
+        self.min_samples = int(min_samples)
+        self.target_acceptance_rate = target_acceptance_rate
+        self.reset()
+
+    def reset(self):
+        r"""Forgets the observed history and the tuned scale."""
+        self.count = 0
+        self.steps = 0
+        self.mean = None
+        self.m2 = None
+        self.log_scale = None
+        self._cholesky = None
+
+    def _initialize(self, xs):
+        self.sigma = self.sigma.to(xs.device, xs.dtype)
+        self.mean = torch.zeros(self.dimensionality, device=xs.device, dtype=xs.dtype)
+        self.m2 = torch.zeros(self.dimensionality, self.dimensionality, device=xs.device, dtype=xs.dtype)
+        self.log_scale = torch.zeros((), device=xs.device, dtype=xs.dtype)
+
+    def covariance(self):
+        r"""Covariance matrix of the current proposal."""
+        if self.count < self.min_samples:
+            covariance = self.sigma
+        else:
+            covariance = self.m2 / (self.count - 1) * (2.38 ** 2 / self.dimensionality)
+        if self.log_scale is not None:
+            covariance = covariance * (2 * self.log_scale).exp()
+        identity = torch.eye(self.dimensionality, device=covariance.device, dtype=covariance.dtype)
+
+        return covariance + self.epsilon * identity
+
+    def _factor(self):
+        if self._cholesky is None:
+            # Does not check the factorization on the host, the covariance is regularized.
+            self._cholesky, _ = torch.linalg.cholesky_ex(self.covariance())
+
+        return self._cholesky
+
+    def adapt(self, xs, acceptance_probabilities):
+        if self.adaptation_steps is not None and self.steps >= self.adaptation_steps:
+            return
+        xs = xs.view(-1, self.dimensionality)
+        if self.mean is None:
+            self._initialize(xs)
+        self.steps += 1
+        # Welford update with a batch of states (Chan et al., 1979).
+        n = xs.size(0)
+        total = self.count + n
+        batch_mean = xs.mean(dim=0)
+        residuals = xs - batch_mean
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + residuals.t() @ residuals + torch.outer(delta, delta) * (self.count * n / total)
+        self.count = total
+        # Robbins-Monro update of the scale.
+        step_size = self.steps ** -self.decay
+        acceptance_rate = acceptance_probabilities.to(xs.dtype).mean()
+        self.log_scale = self.log_scale + step_size * (acceptance_rate - self.target_acceptance_rate)
+        self._cholesky = None
+
+    def log_prob(self, mean, conditionals):
+        normal = MultivariateNormalDistribution(mean, scale_tril=self._factor().to(mean.device))
+
+        return normal.log_prob(conditionals)
+
+    def sample(self, means, samples=1):
         with torch.no_grad():
-            means = means.view(-1, self.dimensionality)
-            mean_samples = torch.Size([samples])
-            for mean in means:
-                normal = MultivariateNormalDistribution(mean, self.sigma)
-                x.append(normal.sample(mean_samples).view(-1, samples, self.dimensionality))
-            x = torch.cat(x, dim=0).squeeze()
+            means = means.view(-1, 1, self.dimensionality)
+            factor = self._factor().to(means.device, means.dtype)
+            noise = torch.randn(means.size(0), samples, self.dimensionality, device=means.device, dtype=means.dtype)
+            x = means + noise @ factor.t()
+            x = x.squeeze()
 
         return x
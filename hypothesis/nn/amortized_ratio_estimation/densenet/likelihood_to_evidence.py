@@ -52,9 +52,14 @@ class LikelihoodToEvidenceRatioEstimatorDenseNet(BaseLikelihoodToEvidenceRatioEs
             layers=trunk_layers,
             transform_output=None)
 
-    def log_ratio(self, inputs, outputs):
-        z_outputs = self.head(outputs)
-        z = torch.cat([inputs, z_outputs], dim=1)
+    def embed_outputs(self, outputs):
+        return self.head(outputs).view(outputs.shape[0], -1)
+
+    def log_ratio_embedded(self, inputs, embeddings):
+        z = torch.cat([inputs.view(inputs.shape[0], -1), embeddings], dim=1)
         log_ratios = self.trunk(z)
 
         return log_ratios
+
+    def log_ratio(self, inputs, outputs):
+        return self.log_ratio_embedded(inputs, self.embed_outputs(outputs))
@@ -42,6 +42,15 @@ class ConservativeLikelihoodToEvidenceCriterion(BaseConservativeCriterion):
 
 
 class BaseLikelihoodToEvidenceRatioEstimator(BaseRatioEstimator):
+    r"""Base class of the likelihood-to-evidence ratio estimators.
+
+    The log ratio can be evaluated in two parts: ``embed_outputs`` embeds
+    the outputs independently of the inputs, and ``log_ratio_embedded``
+    evaluates the log ratio of inputs given the embedded outputs. Repeated
+    evaluations with the same outputs (e.g., MCMC over fixed observations)
+    therefore only need to embed the outputs once. By default, the
+    embedding of the outputs are the outputs themselves.
+    """
 
     def __init__(self):
         super(BaseLikelihoodToEvidenceRatioEstimator, self).__init__()
@@ -51,5 +60,11 @@ class BaseLikelihoodToEvidenceRatioEstimator(BaseRatioEstimator):
 
         return log_ratios.sigmoid(), log_ratios
 
+    def embed_outputs(self, outputs):
+        return outputs
+
+    def log_ratio_embedded(self, inputs, embeddings):
+        return self.log_ratio(inputs=inputs, outputs=embeddings)
+
     def log_ratio(self, inputs, outputs):
         raise NotImplementedError
@@ -37,7 +37,7 @@ class LikelihoodToEvidenceRatioEstimatorResNet(BaseLikelihoodToEvidenceRatioEsti
         super(LikelihoodToEvidenceRatioEstimatorResNet, self).__init__()
         # Construct the convolutional ResNet head.
         self.head = ResNetHead(
-            activation=hypothesis.default.activation,
+            activation=activation,
             batchnorm=batchnorm,
             channels=channels,
             convolution_bias=convolution_bias,
@@ -45,14 +45,14 @@ class LikelihoodToEvidenceRatioEstimatorResNet(BaseLikelihoodToEvidenceRatioEsti
             dilate=dilate,
             groups=groups,
             in_planes=in_planes,
-            shape_xs=shape_xs,
+            shape_xs=shape_outputs,
             width_per_group=width_per_group)
         # Check if custom trunk settings have been defined.
         if trunk_activation is None:
             trunk_activation = activation
         # Construct the trunk of the network.
         dimensionality = self.head.embedding_dimensionality() + compute_dimensionality(shape_inputs)
-        self.trunk = MLP(
+        self.trunk = MultiLayeredPerceptron(
             shape_xs=(dimensionality,),
             shape_ys=(1,),
             activation=trunk_activation,
@@ -60,8 +60,13 @@ class LikelihoodToEvidenceRatioEstimatorResNet(BaseLikelihoodToEvidenceRatioEsti
             layers=trunk_layers,
             transform_output=None)
 
-    def log_ratio(self, inputs, outputs):
-        z_head = self.head(outputs)
-        features = torch.cat([inputs, z_head])
+    def embed_outputs(self, outputs):
+        return self.head(outputs).view(outputs.shape[0], -1)
+
+    def log_ratio_embedded(self, inputs, embeddings):
+        features = torch.cat([inputs.view(inputs.shape[0], -1), embeddings], dim=1)
 
         return self.trunk(features)
+
+    def log_ratio(self, inputs, outputs):
+        return self.log_ratio_embedded(inputs, self.embed_outputs(outputs))
@@ -6,3 +6,9 @@ model needs to be wrapped in a class which inherits from
 
 from .base import Simulator
 from .base import ParallelSimulator
+from .asynchronous import AsyncSimulator
+from .cache import CachedSimulator
+from .profiler import InstrumentedSimulator
+from .profiler import SimulationProfiler
+from .seed import RandomState
+from .seed import SeededSimulator
@@ -0,0 +1,90 @@
+r"""Asynchronous simulators.
+
+Simulators wrapping external binaries or services spend most of their time
+waiting. ``AsyncSimulator`` allows many of those simulations to be in flight
+from a single process, while still exposing the blocking ``forward`` of
+``hypothesis.simulation.Simulator``.
+"""
+
+import asyncio
+import torch
+
+from concurrent.futures import ThreadPoolExecutor
+from hypothesis.exception import SimulatorException
+from hypothesis.simulation.base import Simulator
+
+
+
+class AsyncSimulator(Simulator):
+    r"""Base class of asynchronous simulators.
+
+    Subclasses implement the coroutine ``simulate``, which simulates a single
+    row of the batch. A batch is simulated by ``forward_async``, which keeps
+    at most ``concurrency`` simulations in flight. The blocking ``forward``
+    drives ``forward_async`` on an event loop, such that the simulator can
+    be used wherever a regular simulator is expected.
+
+    Example usage of a simulator wrapping an external binary::
+
+        class MySimulator(AsyncSimulator):
+
+            async def simulate(self, input):
+                stdout = await self.execute("./simulate", *[str(v) for v in input.tolist()])
+
+                return torch.tensor([float(v) for v in stdout.split()])
+
+        simulator = MySimulator(concurrency=256)
+        outputs = simulator(prior.sample(torch.Size([1024])))
+    """
+
+    def __init__(self, concurrency=64):
+        super(AsyncSimulator, self).__init__()
+        self.concurrency = int(concurrency)
+
+    async def simulate(self, input, **kwargs):
+        r"""Simulates a single row of the batch.
+
+        Note:
+            Should be overridden by all subclasses.
+        """
+        raise NotImplementedError
+
+    async def execute(self, *command, input=None):
+        r"""Executes an external program and returns its standard output.
+
+        Raises a ``SimulatorException`` when the program exits with a
+        non-zero status.
+        """
+        process = await asyncio.create_subprocess_exec(*command,
+            stdin=asyncio.subprocess.PIPE if input is not None else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate(input)
+        if process.returncode != 0:
+            raise SimulatorException(stderr.decode(errors="replace"))
+
+        return stdout
+
+    async def forward_async(self, inputs, **kwargs):
+        r"""Simulates the batch with at most ``concurrency`` simulations in flight."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def simulate_row(index):
+            row = {k: v[index] for k, v in kwargs.items()}
+            async with semaphore:
+                return await self.simulate(inputs[index], **row)
+
+        outputs = await asyncio.gather(*[simulate_row(index) for index in range(len(inputs))])
+
+        return torch.stack([torch.as_tensor(x) for x in outputs], dim=0)
+
+    @torch.no_grad()
+    def forward(self, inputs, **kwargs):
+        coroutine = self.forward_async(inputs, **kwargs)
+        # Check if an event loop is already running in this thread (e.g., Jupyter).
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
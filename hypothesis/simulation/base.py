@@ -1,6 +1,8 @@
+import time
 import torch
 
 from multiprocessing import Pool
+from queue import Queue
 
 
 
@@ -30,6 +32,12 @@ class Simulator(torch.nn.Module):
     def __del__(self):
         self.terminate()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.terminate()
+
     def terminate(self):
         r"""Terminates the simulator and cleans up possible contexts.
 
@@ -43,42 +51,242 @@ class Simulator(torch.nn.Module):
 
 
 class ParallelSimulator(Simulator):
+    r"""Executes a simulator in parallel over chunks of the batch.
+
+    By default, a new pool of worker processes is allocated at every call,
+    and the simulator is shipped to the workers together with every chunk.
+    When ``persistent`` is set, the pool is allocated at the first call and
+    reused afterwards. The simulator is shipped to every worker exactly once
+    (at the time the pool is allocated), subsequent calls only transfer the
+    chunks of the batch. The pool is shut down by ``terminate``, or when the
+    simulator is used as a context manager::
+
+        with ParallelSimulator(simulator, workers=8, persistent=True) as s:
+            for _ in range(1000):
+                outputs = s(inputs=prior.sample(torch.Size([1024])))
+
+    When ``shared_outputs`` is set, the outputs are allocated in shared memory
+    by the main process and every worker writes its simulations directly at
+    the offset of its chunk. The results are therefore never pickled or
+    concatenated. The shape of a single output row (``output_shape``) can be
+    specified beforehand, otherwise it is derived (once) by simulating the
+    first row of the batch in the main process. This mode is intended for
+    large outputs (e.g., images), as the shared tensor is handed to the
+    workers together with every chunk.
+
+    By default, the batch is split in one static chunk per worker. This is
+    inefficient for simulators whose cost varies strongly across the prior,
+    as the slowest chunk determines the duration of the call. Specifying a
+    ``chunk_size`` enables dynamic scheduling: the batch is split in small
+    chunks which are pulled by the workers as soon as they are idle. With
+    ``adaptive`` scheduling, the chunk size is derived from the observed
+    per-sample latency such that a chunk takes approximately
+    ``chunk_duration`` seconds. Dynamic chunks never exceed half of an equal
+    share of the remaining rows, such that the tail of the batch is balanced.
+
+    When the batch holds per-sample ``seeds`` (see
+    ``hypothesis.simulation.seed``), the outputs are identical to the outputs
+    of the batch simulated at once, regardless of the chunks.
+
+    A ``profiler`` (see ``hypothesis.simulation.profiler``) records the wall
+    time of every call, the per-sample latencies measured by the workers, and
+    the utilization of the workers.
 
-    def __init__(self, simulator, workers=2):
+    Note:
+        Changes to the state of the wrapped simulator after the persistent
+        pool has been allocated are not propagated to the workers.
+    """
+
+    def __init__(self, simulator,
+        workers=2,
+        persistent=False,
+        shared_outputs=False,
+        output_shape=None,
+        output_dtype=torch.float32,
+        chunk_size=None,
+        adaptive=False,
+        chunk_duration=0.1,
+        profiler=None):
         super(ParallelSimulator, self).__init__()
+        self.adaptive = adaptive
+        self.chunk_duration = float(chunk_duration)
+        self.chunk_size = chunk_size
+        self.latency = None # Running estimate of the per-sample latency.
+        self.output_dtype = output_dtype
+        self.output_shape = output_shape
+        self.persistent = persistent
+        self.pool = None
+        self.profiler = profiler
+        self.shared_outputs = shared_outputs
         self.simulator = simulator
         self.workers = workers
 
+    def _dynamic(self):
+        return self.adaptive or self.chunk_size is not None
+
+    def _next_chunk_size(self, rows, remaining):
+        # Static scheduling, one chunk per worker.
+        if not self._dynamic():
+            return max(rows // self.workers, 1)
+        # Dynamic scheduling, bounded by the share of the remaining rows.
+        if self.adaptive and self.latency is not None:
+            chunk_size = int(self.chunk_duration / max(self.latency, 1e-9))
+        elif self.chunk_size is not None:
+            chunk_size = int(self.chunk_size)
+        else:
+            chunk_size = 1
+        share = -(-remaining // (2 * self.workers))
+
+        return max(min(chunk_size, share), 1)
+
+    def _observe(self, num_samples, elapsed):
+        latency = elapsed / max(num_samples, 1)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.9 * self.latency + 0.1 * latency
+
     @torch.no_grad()
-    def _prepare_arguments(self, **kwargs):
-        arguments = []
+    def _prepare_argument(self, base, chunk_size, outputs, kwargs):
+        chunk = {}
+        tensors = []
+        for k, v in kwargs.items():
+            v = v[base:base + chunk_size]
+            # CPU tensors are far cheaper to transfer as arrays.
+            if torch.is_tensor(v) and v.device.type == "cpu":
+                v = v.numpy()
+                tensors.append(k)
+            chunk[k] = v
+        # The persistent workers already hold the simulator.
+        if self.persistent:
+            simulator = None
+        else:
+            simulator = self.simulator
 
-        # Determine the number of chunks
+        return simulator, base, chunk, tensors, outputs
+
+    @torch.no_grad()
+    def _allocate_outputs(self, **kwargs):
         rows = kwargs[list(kwargs.keys())[0]].shape[0]
-        chunk_size = rows // self.workers
-        if chunk_size == 0:
-            chunk_size = 1
-        for base in range(0, rows, chunk_size):
-            argument = {}
-            for k, v in kwargs.items():
-                argument[k] = v[base:base + chunk_size]
-            arguments.append((self.simulator, argument))
+        # Check if the shape of an output row needs to be derived.
+        if self.output_shape is None:
+            probe = self.simulator(**{k: v[:1] for k, v in kwargs.items()})
+            self.output_dtype = probe.dtype
+            self.output_shape = tuple(probe.shape[1:])
+        shape = (rows,) + tuple(self.output_shape)
+
+        return torch.empty(shape, dtype=self.output_dtype).share_memory_()
+
+    def _allocate_pool(self):
+        if self.pool is None:
+            self.pool = Pool(
+                processes=self.workers,
+                initializer=_initialize_worker,
+                initargs=(self.simulator,))
+
+        return self.pool
+
+    @torch.no_grad()
+    def _schedule(self, pool, outputs, kwargs):
+        results = {}
+
+        rows = kwargs[list(kwargs.keys())[0]].shape[0]
+        busy_time = 0.0
+        completed = Queue()
+        latencies = torch.zeros(rows, dtype=torch.float64)
+        base = 0
+        in_flight = 0
+        # Keep every worker busy while the next chunks are being prepared.
+        max_in_flight = 2 * self.workers
+        while base < rows or in_flight > 0:
+            while base < rows and in_flight < max_in_flight:
+                chunk_size = self._next_chunk_size(rows, rows - base)
+                arguments = self._prepare_argument(base, chunk_size, outputs, kwargs)
+                pool.apply_async(self._simulate, (arguments,),
+                    callback=completed.put,
+                    error_callback=completed.put)
+                base += chunk_size
+                in_flight += 1
+            result = completed.get()
+            in_flight -= 1
+            if isinstance(result, BaseException):
+                raise result
+            chunk_base, num_samples, x, elapsed = result
+            self._observe(num_samples, elapsed)
+            busy_time += elapsed
+            latencies[chunk_base:chunk_base + num_samples] = elapsed / max(num_samples, 1)
+            if x is not None:
+                if not torch.is_tensor(x):
+                    x = torch.from_numpy(x)
+                results[chunk_base] = x
+
+        results = [results[k] for k in sorted(results.keys())]
 
-        return arguments
+        return results, busy_time, latencies
 
     @torch.no_grad()
     def forward(self, **kwargs):
-        pool = Pool(processes=self.workers)
-        arguments = self._prepare_arguments(**kwargs)
-        outputs = pool.map(self._simulate, arguments)
-        pool.close()
-        pool.join()
-        del pool
+        start = time.perf_counter()
+        if self.shared_outputs:
+            outputs = self._allocate_outputs(**kwargs)
+        else:
+            outputs = None
+        if self.persistent:
+            results, busy_time, latencies = self._schedule(self._allocate_pool(), outputs, kwargs)
+        else:
+            pool = Pool(processes=self.workers)
+            try:
+                results, busy_time, latencies = self._schedule(pool, outputs, kwargs)
+            finally:
+                pool.close()
+                pool.join()
+                del pool
+        # Outputs in shared memory have been written in-place by the workers.
+        if outputs is None:
+            outputs = torch.cat(results, dim=0)
+        if self.profiler is not None:
+            self.profiler.record(len(latencies), time.perf_counter() - start,
+                inputs=kwargs.get("inputs"),
+                latencies=latencies,
+                busy_time=busy_time,
+                workers=self.workers)
 
-        return torch.cat(outputs, dim=0)
+        return outputs
+
+    def terminate(self):
+        r"""Shuts down the persistent pool of workers, if any."""
+        pool = getattr(self, "pool", None)
+        if pool is not None:
+            pool.close()
+            pool.join()
+            self.pool = None
 
     @staticmethod
+    @torch.no_grad()
     def _simulate(arguments):
-        simulator, kwargs = arguments
+        simulator, base, kwargs, tensors, outputs = arguments
+        if simulator is None:
+            simulator = _worker_simulator
+        for k in tensors:
+            kwargs[k] = torch.from_numpy(kwargs[k])
+        start = time.perf_counter()
+        x = simulator(**kwargs)
+        elapsed = time.perf_counter() - start
+        num_samples = x.shape[0]
+        # Check if the result has to be written to shared memory.
+        if outputs is not None:
+            outputs[base:base + num_samples] = x
+            x = None
+        elif x.device.type == "cpu" and x.numel() * x.element_size() < 2 ** 20:
+            x = x.numpy() # Small arrays are cheaper to transfer than tensors.
+
+        return base, num_samples, x, elapsed
+
+
+
+_worker_simulator = None # Simulator assigned to a persistent worker process.
+
 
-        return simulator(**kwargs)
+def _initialize_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
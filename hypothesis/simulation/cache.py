@@ -0,0 +1,295 @@
+r"""Content-addressed caching of simulations.
+
+Simulations are identified by a hash of their inputs, their experimental
+configuration (or any other keyword argument) and a seed. Recently used
+simulations are kept in a bounded in-memory LRU tier, and optionally all
+simulations are persisted in a memory-mapped on-disk tier.
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+import torch
+
+from collections import OrderedDict
+from hypothesis.simulation.base import Simulator
+
+
+
+class CachedSimulator(Simulator):
+    r"""Caches the simulations of the wrapped simulator.
+
+    Only the rows of a batch which are not cached are simulated, in a single
+    call to the wrapped simulator. Caching is only meaningful for simulators
+    which are deterministic given their arguments and the ``seed``. Per-sample
+    seeds (see ``hypothesis.simulation.seed``) are batched arguments, and are
+    therefore part of the key of every row. The missing rows of a seeded
+    batch are identical to the rows the full batch would have produced (see
+    ``SeededSimulator``). The keys also include a fingerprint of the
+    simulator (its class, simple attributes and state), such that an on-disk
+    tier is not shared by different simulators.
+
+    Example usage::
+
+        simulator = CachedSimulator(MySimulator(), capacity=100000, path="cache")
+        outputs = simulator(inputs, experimental_configurations=designs)
+        print(simulator.hit_rate())
+
+    Args:
+        simulator (Simulator): the simulator to cache.
+        capacity (int): number of simulations in the in-memory tier.
+        path (str): directory of the on-disk tier (default: none, disabled).
+        seed (int): seed of the simulations, part of the cache key.
+        fingerprint (str): identifies the simulator in the cache key
+            (default: derived from the simulator).
+    """
+
+    def __init__(self, simulator, capacity=10000, path=None, seed=None, fingerprint=None):
+        super(CachedSimulator, self).__init__()
+        self.capacity = int(capacity)
+        self.memory = OrderedDict()
+        self.seed = seed
+        self.simulator = simulator
+        if fingerprint is None:
+            fingerprint = _fingerprint(simulator)
+        self.fingerprint = fingerprint
+        if path is not None:
+            self.disk = _DiskCache(path)
+        else:
+            self.disk = None
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        self.disk_hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    def hit_rate(self):
+        lookups = self.hits() + self.misses
+        if lookups == 0:
+            return 0.0
+
+        return self.hits() / lookups
+
+    def statistics(self):
+        return {
+            "disk_hits": self.disk_hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate()}
+
+    def clear(self):
+        r"""Clears the in-memory tier, the on-disk tier is preserved."""
+        self.memory.clear()
+
+    def _keys(self, kwargs):
+        rows = len(kwargs["inputs"])
+        digests = []
+        # Arguments which are not batched are part of every key.
+        prefix = hashlib.blake2b(digest_size=16)
+        prefix.update(self.fingerprint.encode())
+        prefix.update(repr(self.seed).encode())
+        batched = []
+        for k in sorted(kwargs.keys()):
+            v = kwargs[k]
+            if torch.is_tensor(v) and v.dim() > 0 and v.shape[0] == rows:
+                batched.append((k, v.detach().cpu().contiguous().numpy()))
+            else:
+                prefix.update(k.encode())
+                _update(prefix, v)
+        for index in range(rows):
+            digest = prefix.copy()
+            for k, v in batched:
+                digest.update(k.encode())
+                digest.update(v.dtype.str.encode())
+                digest.update(repr(v.shape[1:]).encode())
+                digest.update(v[index].tobytes())
+            digests.append(digest.digest())
+
+        return digests
+
+    def _lookup(self, key):
+        x = self.memory.get(key)
+        if x is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return x
+        if self.disk is not None:
+            x = self.disk.get(key)
+            if x is not None:
+                self._insert(key, x)
+                self.disk_hits += 1
+                return x
+        self.misses += 1
+
+        return None
+
+    def _insert(self, key, x):
+        self.memory[key] = x
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    @torch.no_grad()
+    def forward(self, inputs, **kwargs):
+        kwargs["inputs"] = inputs
+        rows = len(inputs)
+        keys = self._keys(kwargs)
+        outputs = [self._lookup(key) for key in keys]
+        misses = [index for index in range(rows) if outputs[index] is None]
+        # Simulate all missing rows at once.
+        if len(misses) > 0:
+            indices = torch.tensor(misses, dtype=torch.long)
+            arguments = {}
+            for k, v in kwargs.items():
+                if torch.is_tensor(v) and v.dim() > 0 and v.shape[0] == rows:
+                    v = v[indices.to(v.device)]
+                arguments[k] = v
+            simulated = self.simulator(**arguments).cpu()
+            for index, x in zip(misses, simulated):
+                key = keys[index]
+                # A row view would keep the storage of the whole batch alive.
+                x = x.clone()
+                self._insert(key, x)
+                if self.disk is not None:
+                    self.disk.put(key, x)
+                outputs[index] = x
+            if self.disk is not None:
+                self.disk.flush()
+
+        return torch.stack(outputs, dim=0)
+
+    def terminate(self):
+        disk = getattr(self, "disk", None)
+        if disk is not None:
+            disk.close()
+
+
+
+def _update(digest, value):
+    r"""Hashes the exact contents of an argument which is not batched."""
+    if torch.is_tensor(value):
+        value = value.detach().cpu().contiguous().numpy()
+    if isinstance(value, np.ndarray):
+        digest.update(value.dtype.str.encode())
+        digest.update(repr(value.shape).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def _fingerprint(simulator):
+    r"""Fingerprint of the class, the simple attributes and the state of a simulator."""
+    digest = hashlib.blake2b(digest_size=16)
+    simple = (bool, int, float, str, type(None))
+    for name, module in simulator.named_modules():
+        digest.update((name + type(module).__module__ + "." + type(module).__qualname__).encode())
+        for k, v in sorted(vars(module).items()):
+            if not k.startswith("_") and k != "training" and isinstance(v, simple):
+                digest.update((k + repr(v)).encode())
+    for k, v in simulator.state_dict().items():
+        digest.update(k.encode())
+        _update(digest, v)
+
+    return digest.hexdigest()
+
+
+
+class _DiskCache:
+    r"""Append-only on-disk cache of fixed-shape simulations.
+
+    The keys and the outputs are appended to separate files, the outputs are
+    read back through a memory map.
+    """
+
+    KEY_BYTES = 16
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}
+        self.data = None # Memory map of the outputs.
+        self.fd_keys = None
+        self.fd_outputs = None
+        self.shape = None
+        self.dtype = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file("metadata.json")):
+            return
+        with open(self._file("metadata.json"), "r") as fd:
+            metadata = json.load(fd)
+        self.shape = tuple(metadata["shape"])
+        self.dtype = np.dtype(metadata["dtype"])
+        # Simulations with incomplete keys or outputs are ignored.
+        with open(self._file("keys.bin"), "rb") as fd:
+            keys = fd.read()
+        num_keys = len(keys) // self.KEY_BYTES
+        num_outputs = os.path.getsize(self._file("outputs.bin")) // self._row_bytes()
+        num_entries = min(num_keys, num_outputs)
+        # Truncate partially written entries, such that appends stay aligned.
+        os.truncate(self._file("keys.bin"), num_entries * self.KEY_BYTES)
+        os.truncate(self._file("outputs.bin"), num_entries * self._row_bytes())
+        for index in range(num_entries):
+            key = keys[index * self.KEY_BYTES:(index + 1) * self.KEY_BYTES]
+            self.index[key] = index
+
+    def _row_bytes(self):
+        return int(np.prod(self.shape, dtype=np.int64)) * self.dtype.itemsize
+
+    def _open(self, x):
+        if self.shape is None:
+            self.shape = tuple(x.shape)
+            self.dtype = np.dtype(x.numpy().dtype)
+            with open(self._file("metadata.json"), "w") as fd:
+                json.dump({"shape": self.shape, "dtype": self.dtype.str}, fd)
+        if self.fd_outputs is None:
+            self.fd_outputs = open(self._file("outputs.bin"), "ab")
+            self.fd_keys = open(self._file("keys.bin"), "ab")
+
+    def get(self, key):
+        index = self.index.get(key)
+        if index is None:
+            return None
+        # Remap the outputs when they have grown.
+        if self.data is None or index >= len(self.data):
+            self.data = np.memmap(self._file("outputs.bin"),
+                dtype=self.dtype,
+                mode="r",
+                shape=(len(self.index),) + self.shape)
+
+        return torch.from_numpy(np.array(self.data[index]))
+
+    def put(self, key, x):
+        if key in self.index:
+            return
+        self._open(x)
+        self.fd_outputs.write(x.numpy().astype(self.dtype, copy=False).tobytes())
+        self.fd_keys.write(key)
+        self.index[key] = len(self.index)
+
+    def flush(self):
+        # Outputs are flushed first, such that every key refers to an output.
+        if self.fd_outputs is not None:
+            self.fd_outputs.flush()
+            self.fd_keys.flush()
+
+    def close(self):
+        self.flush()
+        if self.fd_outputs is not None:
+            self.fd_outputs.close()
+            self.fd_keys.close()
+        self.fd_outputs = None
+        self.fd_keys = None
+        self.data = None
+
+    def __len__(self):
+        return len(self.index)
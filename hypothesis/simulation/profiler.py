@@ -0,0 +1,239 @@
+r"""Instrumentation of simulators.
+
+A ``SimulationProfiler`` collects the wall time of simulator calls, the
+per-sample latency, the throughput, failures and retries, and the worker
+utilization of a ``ParallelSimulator``. Per-sample latencies can be bucketed
+by the region of the parameter space, such that expensive regions of the
+prior are identified. Every call is optionally appended as a JSON line to a
+log file.
+
+Example usage::
+
+    profiler = SimulationProfiler(lower=prior.low, upper=prior.high, bins=10, path="simulations.jsonl")
+    simulator = InstrumentedSimulator(MySimulator(), profiler)
+    outputs = simulator(inputs)
+    print(profiler.summary())
+    print(profiler.regions())
+"""
+
+import json
+import numpy as np
+import time
+import torch
+
+from hypothesis.simulation.base import Simulator
+
+
+
+class SimulationProfiler:
+    r"""Collects the metrics of simulator calls.
+
+    Args:
+        path (str): JSON lines file to which every call is appended (default: none).
+        lower (Tensor): lower bound of the parameter space, required for the regions.
+        upper (Tensor): upper bound of the parameter space, required for the regions.
+        bins (int): number of regions per dimension of the parameter space.
+        reservoir (int): number of per-sample latencies kept for the percentiles.
+    """
+
+    def __init__(self, path=None, lower=None, upper=None, bins=10, reservoir=100000):
+        self.bins = int(bins)
+        self.lower = None if lower is None else torch.as_tensor(lower).float().view(-1)
+        self.path = path
+        self.reservoir = int(reservoir)
+        # Private generator, profiling should not alter the random streams of the simulators.
+        self.random = np.random.default_rng()
+        self.upper = None if upper is None else torch.as_tensor(upper).float().view(-1)
+        self.reset()
+
+    def reset(self):
+        self.busy_time = 0.0
+        self.calls = 0
+        self.elapsed = 0.0
+        self.failures = 0
+        self.latencies = np.zeros(self.reservoir)
+        self.num_latencies = 0
+        self.region_counts = {}
+        self.region_times = {}
+        self.retries = 0
+        self.samples = 0
+        self.worker_time = 0.0
+
+    def _record_regions(self, inputs, latencies):
+        inputs = inputs.detach().cpu().float().view(inputs.shape[0], -1)
+        scaled = (inputs - self.lower) / (self.upper - self.lower)
+        indices = (scaled * self.bins).floor().clamp(0, self.bins - 1).long().numpy()
+        regions, inverse = np.unique(indices, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(regions))
+        times = np.bincount(inverse, weights=latencies, minlength=len(regions))
+        for region, count, t in zip(map(tuple, regions.tolist()), counts.tolist(), times.tolist()):
+            self.region_counts[region] = self.region_counts.get(region, 0) + count
+            self.region_times[region] = self.region_times.get(region, 0.0) + t
+
+    def _record_latencies(self, latencies):
+        # Fill the reservoir, and afterwards apply reservoir sampling.
+        n = len(latencies)
+        free = max(min(self.reservoir - self.num_latencies, n), 0)
+        self.latencies[self.num_latencies:self.num_latencies + free] = latencies[:free]
+        if free < n:
+            seen = np.arange(self.num_latencies + free, self.num_latencies + n) + 1
+            indices = (self.random.random(n - free) * seen).astype(np.int64)
+            replace = indices < self.reservoir
+            self.latencies[indices[replace]] = latencies[free:][replace]
+        self.num_latencies += n
+
+    def record(self, num_samples, elapsed, inputs=None, latencies=None, failures=0, busy_time=None, workers=1):
+        r"""Records a simulator call.
+
+        Args:
+            num_samples (int): number of simulated samples.
+            elapsed (float): wall time of the call in seconds.
+            inputs (Tensor): inputs of the call, used for the regions.
+            latencies (Tensor): per-sample latencies, defaults to ``elapsed / num_samples``.
+            failures (int): number of failed samples.
+            busy_time (float): accumulated time the workers were simulating.
+            workers (int): number of workers available during the call.
+        """
+        if latencies is None:
+            latencies = torch.full((num_samples,), elapsed / max(num_samples, 1))
+        latencies = torch.as_tensor(latencies).double().view(-1).numpy()
+        self.calls += 1
+        self.elapsed += elapsed
+        self.failures += int(failures)
+        self.samples += int(num_samples)
+        if busy_time is None:
+            busy_time = elapsed * workers
+        self.busy_time += busy_time
+        self.worker_time += elapsed * workers
+        self._record_latencies(latencies)
+        # Bucket the per-sample latencies by the region of the parameter space.
+        if inputs is not None and self.lower is not None and self.upper is not None:
+            self._record_regions(inputs, latencies)
+        if self.path is not None:
+            self._write({
+                "time": time.time(),
+                "samples": int(num_samples),
+                "elapsed": elapsed,
+                "samples_per_second": num_samples / elapsed if elapsed > 0 else None,
+                "failures": int(failures),
+                "utilization": busy_time / (elapsed * workers) if elapsed > 0 else None})
+
+    def record_failures(self, n=1):
+        self.failures += int(n)
+
+    def record_retries(self, n=1):
+        self.retries += int(n)
+
+    def samples_per_second(self):
+        if self.elapsed == 0:
+            return 0.0
+
+        return self.samples / self.elapsed
+
+    def utilization(self):
+        if self.worker_time == 0:
+            return 0.0
+
+        return self.busy_time / self.worker_time
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        n = min(self.num_latencies, self.reservoir)
+        if n == 0:
+            return {p: None for p in percentiles}
+        values = np.percentile(self.latencies[:n], percentiles)
+
+        return {p: float(v) for p, v in zip(percentiles, values)}
+
+    def regions(self):
+        r"""Returns the mean per-sample latency of every visited region."""
+        regions = []
+        for region, count in self.region_counts.items():
+            regions.append({
+                "region": list(region),
+                "samples": count,
+                "latency": self.region_times[region] / count})
+        regions.sort(key=lambda r: r["latency"], reverse=True)
+
+        return regions
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "samples": self.samples,
+            "elapsed": self.elapsed,
+            "samples_per_second": self.samples_per_second(),
+            "latency_percentiles": {str(k): v for k, v in self.latency_percentiles().items()},
+            "failures": self.failures,
+            "retries": self.retries,
+            "utilization": self.utilization()}
+
+    def dump(self, path=None):
+        r"""Appends the summary and the regions as a JSON line to ``path`` (default: the path of the profiler)."""
+        record = self.summary()
+        record["regions"] = self.regions()
+        self._write(record, path)
+
+    def _write(self, record, path=None):
+        if path is None:
+            path = self.path
+        if path is None:
+            raise ValueError("A path is required to write the profile, none has been specified.")
+        with open(path, "a") as fd:
+            fd.write(json.dumps(record) + "\n")
+
+
+
+class InstrumentedSimulator(Simulator):
+    r"""Records the metrics of the wrapped simulator in a ``SimulationProfiler``.
+
+    Failures are exceptions raised by the simulator and non-finite output
+    rows. When ``per_sample`` is set, the batch is simulated row by row to
+    measure the exact latency of every sample (at the expense of batching).
+    """
+
+    def __init__(self, simulator, profiler=None, per_sample=False):
+        super(InstrumentedSimulator, self).__init__()
+        if profiler is None:
+            profiler = SimulationProfiler()
+        self.per_sample = per_sample
+        self.profiler = profiler
+        self.simulator = simulator
+
+    def _simulate_per_sample(self, inputs, kwargs):
+        latencies = []
+        outputs = []
+
+        rows = len(inputs)
+        for index in range(rows):
+            arguments = {}
+            for k, v in kwargs.items():
+                if torch.is_tensor(v) and v.dim() > 0 and v.shape[0] == rows:
+                    v = v[index:index + 1]
+                arguments[k] = v
+            start = time.perf_counter()
+            outputs.append(self.simulator(inputs[index:index + 1], **arguments))
+            latencies.append(time.perf_counter() - start)
+
+        return torch.cat(outputs, dim=0), torch.tensor(latencies)
+
+    @torch.no_grad()
+    def forward(self, inputs, **kwargs):
+        start = time.perf_counter()
+        try:
+            if self.per_sample:
+                outputs, latencies = self._simulate_per_sample(inputs, kwargs)
+            else:
+                outputs = self.simulator(inputs, **kwargs)
+                latencies = None
+        except Exception:
+            self.profiler.record_failures(len(inputs))
+            raise
+        elapsed = time.perf_counter() - start
+        failures = (~torch.isfinite(outputs.view(outputs.shape[0], -1)).all(dim=1)).sum().item()
+        self.profiler.record(len(inputs), elapsed,
+            inputs=inputs,
+            latencies=latencies,
+            failures=failures)
+
+        return outputs
@@ -0,0 +1,214 @@
+r"""Counter-based seeding of simulations.
+
+Every sample is assigned its own seed, which only depends on a global seed
+and the index of the sample. The seeds are derived by the SplitMix64
+generator, a counter-based construction: the seed of a sample is a bijective
+hash of ``(seed, index)``. Therefore, a batch simulated in chunks, in shards or
+in different processes is bit-identical to the same batch simulated at once.
+
+Simulators consume the seeds through ``SeededSimulator``, which simulates
+the batch in a single vectorized call. Every row draws its random numbers
+from its own SplitMix64 stream seeded by the seed of the row, such that the
+output of a row does not depend on the other rows of the batch.
+
+Example usage::
+
+    seeds = derive_seeds(seed=42, n=1024)
+    outputs = simulator(inputs, seeds=seeds)
+    outputs = ParallelSimulator(simulator, workers=8)(inputs=inputs, seeds=seeds) # Identical
+
+    # The third shard of 1024 samples.
+    seeds = derive_seeds(seed=42, n=1024, offset=2 * 1024)
+"""
+
+import contextlib
+import math
+import numpy as np
+import random
+import scipy.stats
+import torch
+
+from hypothesis.simulation.base import Simulator
+
+
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _splitmix64(z):
+    with np.errstate(over="ignore"):
+        z = (z ^ (z >> np.uint64(30))) * _MIX_1
+        z = (z ^ (z >> np.uint64(27))) * _MIX_2
+
+    return z ^ (z >> np.uint64(31))
+
+
+def _signed(constant):
+    # Torch has no unsigned 64-bit integers, the arithmetic wraps around on int64.
+    return int(constant) - (1 << 64) if int(constant) >= (1 << 63) else int(constant)
+
+
+def _shift(z, bits):
+    # Logical right shift of int64 tensors.
+    return (z >> bits) & ((1 << (64 - bits)) - 1)
+
+
+def _splitmix64_tensor(z):
+    z = (z ^ _shift(z, 30)) * _signed(_MIX_1)
+    z = (z ^ _shift(z, 27)) * _signed(_MIX_2)
+
+    return z ^ _shift(z, 31)
+
+
+def derive_seeds(seed, n, offset=0):
+    r"""Derives the seeds of the samples ``offset`` to ``offset + n``.
+
+    Returns a ``torch.LongTensor`` of non-negative 63-bit seeds.
+    """
+    indices = np.arange(offset, offset + n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        key = _splitmix64(np.uint64(seed) * _GOLDEN_GAMMA)
+        seeds = _splitmix64(key + (indices + np.uint64(1)) * _GOLDEN_GAMMA)
+    seeds = (seeds >> np.uint64(1)).astype(np.int64)
+
+    return torch.from_numpy(seeds)
+
+
+@contextlib.contextmanager
+def fork_rng(seed):
+    r"""Seeds the global Python, NumPy and PyTorch (CPU) random number
+    generators, and restores their original state on exit."""
+    seed = int(seed)
+    state_numpy = np.random.get_state()
+    state_python = random.getstate()
+    state_torch = torch.get_rng_state()
+    try:
+        np.random.seed([seed & 0xFFFFFFFF, seed >> 32])
+        random.seed(seed)
+        torch.default_generator.manual_seed(seed)
+        yield
+    finally:
+        np.random.set_state(state_numpy)
+        random.setstate(state_python)
+        torch.set_rng_state(state_torch)
+
+
+class RandomState:
+    r"""Random number generators of a batched simulation.
+
+    Without ``seeds``, the samples are drawn from the global PyTorch
+    generator. With ``seeds``, every row of the batch draws from its own
+    counter-based stream: the ``i``-th number of a row is the SplitMix64 hash
+    of its seed and ``i``. The streams of all rows are evaluated together
+    with tensor operations, and the global generators are neither used nor
+    modified.
+
+    The leading dimension of the requested ``shape`` (or of the parameters)
+    indexes the rows ``rows`` of the batch (default: all rows), and a draw
+    only advances the streams of these rows. A row therefore receives the
+    same numbers regardless of the other rows of the batch, provided the
+    draws it participates in only depend on the row itself. Simulators which
+    mask out finished rows draw for the ``rows`` which are still active.
+    """
+
+    def __init__(self, seeds=None, device=None):
+        if seeds is not None:
+            seeds = torch.as_tensor(seeds, dtype=torch.int64, device=device).view(-1)
+        self.seeds = seeds
+        if seeds is not None:
+            self.counters = torch.zeros_like(seeds)
+
+    def _uniform(self, shape, rows):
+        if rows is None:
+            rows = torch.arange(len(self.seeds), device=self.seeds.device)
+        rows = torch.as_tensor(rows, device=self.seeds.device)
+        shape = torch.Size(shape)
+        if shape[0] != len(rows):
+            raise ValueError("The leading dimension of the shape does not match the number of rows.")
+        size = shape[1:].numel()
+        counters = self.counters[rows].view(-1, 1) + torch.arange(1, size + 1, device=rows.device)
+        self.counters[rows] += size
+        z = _splitmix64_tensor(self.seeds[rows].view(-1, 1) + counters * _signed(_GOLDEN_GAMMA))
+        # The 53 most significant bits, centered in (0, 1).
+        u = (_shift(z, 11).double() + 0.5) * (2.0 ** -53)
+
+        return u.view(shape)
+
+    def uniform(self, shape, rows=None, dtype=None, device=None):
+        r"""Uniform samples in the unit interval."""
+        if dtype is None:
+            dtype = torch.get_default_dtype()
+        if self.seeds is None:
+            return torch.rand(shape, dtype=dtype, device=device)
+
+        return self._uniform(shape, rows).to(dtype=dtype, device=device)
+
+    def normal(self, shape, rows=None, dtype=None, device=None):
+        r"""Standard normal samples."""
+        if dtype is None:
+            dtype = torch.get_default_dtype()
+        if self.seeds is None:
+            return torch.randn(shape, dtype=dtype, device=device)
+        # Box-Muller transform.
+        shape = torch.Size(shape)
+        u = self._uniform(shape[:1] + torch.Size([2]) + shape[1:], rows)
+        z = (-2 * u[:, 0].log()).sqrt() * torch.cos(2 * math.pi * u[:, 1])
+
+        return z.to(dtype=dtype, device=device)
+
+    def bernoulli(self, probabilities, rows=None):
+        r"""Bernoulli samples with the given success ``probabilities``."""
+        if self.seeds is None:
+            return torch.bernoulli(probabilities)
+        u = self._uniform(probabilities.shape, rows).to(probabilities.device)
+
+        return (u < probabilities).to(probabilities.dtype)
+
+    def binomial(self, count, probability, rows=None):
+        r"""Binomial samples, ``count`` and ``probability`` have the same shape."""
+        if self.seeds is None:
+            return torch.binomial(count, probability)
+        # Inverse transform, which is exact and consumes a single number per sample.
+        u = self._uniform(count.shape, rows).cpu().numpy()
+        samples = scipy.stats.binom.ppf(u, count.double().cpu().numpy(), probability.double().cpu().numpy())
+
+        return torch.from_numpy(samples).to(dtype=count.dtype, device=count.device)
+
+    def poisson(self, rate, rows=None):
+        r"""Poisson samples with the given ``rate``."""
+        if self.seeds is None:
+            return torch.poisson(rate)
+        u = self._uniform(rate.shape, rows).cpu().numpy()
+        samples = scipy.stats.poisson.ppf(u, rate.double().cpu().numpy())
+
+        return torch.from_numpy(samples).to(dtype=rate.dtype, device=rate.device)
+
+
+
+class SeededSimulator(Simulator):
+    r"""Base class of batched simulators supporting per-sample seeds.
+
+    Subclasses draw all their randomness from the ``random_state`` keyword
+    argument of ``forward`` (a ``RandomState``). Calling the simulator with
+    the batched keyword argument ``seeds`` simulates the batch in a single
+    vectorized call, in which every row draws from the stream of its own
+    seed. The global random state is neither used nor modified, such that
+    seeded simulations are safe in the presence of other threads.
+
+    The output of a row only depends on its arguments and its seed. A batch
+    simulated in chunks, in shards or row by row, e.g., the missing rows of
+    a partially cached batch, is therefore identical to the batch simulated
+    at once, up to the rounding of vectorized floating point kernels, which
+    may depend on the size of the batch.
+    """
+
+    def __call__(self, *args, seeds=None, **kwargs):
+        if seeds is None:
+            return super(SeededSimulator, self).__call__(*args, **kwargs)
+        tensors = [v for v in list(args) + list(kwargs.values()) if torch.is_tensor(v)]
+        device = tensors[0].device if len(tensors) > 0 else "cpu"
+        random_state = RandomState(seeds, device=device)
+        with torch.no_grad():
+            return super(SeededSimulator, self).__call__(*args, random_state=random_state, **kwargs)
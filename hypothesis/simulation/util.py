@@ -1,5 +1,11 @@
+import atexit
+import threading
 import torch
 
+from queue import Empty
+from queue import Full
+from queue import Queue
+
 
 
 def sample_joint(simulator, prior, n=1):
@@ -11,9 +17,13 @@ def sample_joint(simulator, prior, n=1):
 
 
 
-def joint_sampler(simulator, prior):
-    r""""""
-    yield sample_joint(simulator, prior, n=1)
+def joint_sampler(simulator, prior, batch_size=1, prefetch=1):
+    r"""Infinite generator of batches of the joint.
+
+    The next ``prefetch`` batches are simulated in a background thread while
+    the consumer processes the current batch.
+    """
+    yield from prefetcher(lambda: sample_joint(simulator, prior, n=batch_size), prefetch)
 
 
 
@@ -25,9 +35,13 @@ def sample_marginal(simulator, prior, n=1):
 
 
 
-def marginal_sampler(simulator, prior):
-    r""""""
-    yield sample_marginal(simulator, prior, n=1)
+def marginal_sampler(simulator, prior, batch_size=1, prefetch=1):
+    r"""Infinite generator of batches of the marginal model.
+
+    The next ``prefetch`` batches are simulated in a background thread while
+    the consumer processes the current batch.
+    """
+    yield from prefetcher(lambda: sample_marginal(simulator, prior, n=batch_size), prefetch)
 
 
 
@@ -40,6 +54,85 @@ def sample_likelihood(simulator, input, n=1):
 
 
 
-def likelihood_sampler(simulator, input):
-    r""""""
-    yield sample_likelihood(simulator, input, n=1)
+def likelihood_sampler(simulator, input, batch_size=1, prefetch=1):
+    r"""Infinite generator of batches of the likelihood model.
+
+    The next ``prefetch`` batches are simulated in a background thread while
+    the consumer processes the current batch.
+    """
+    yield from prefetcher(lambda: sample_likelihood(simulator, input, n=batch_size), prefetch)
+
+
+
+def prefetcher(f, prefetch=1):
+    r"""Infinite generator of the results of ``f``.
+
+    The next ``prefetch`` results are computed in a background thread. The
+    thread only runs concurrently with the consumer when ``f`` releases the
+    GIL, which is the case for PyTorch and NumPy operations, or when ``f``
+    waits for other processes (e.g., a ``ParallelSimulator``). Exceptions
+    raised by ``f`` are raised in the consumer. A ``prefetch`` of 0 disables
+    the background thread.
+    """
+    # Check if prefetching has been disabled.
+    if prefetch < 1:
+        while True:
+            with torch.no_grad():
+                result = f()
+            yield result
+    queue = Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def produce():
+        exception = None
+        while not stop.is_set() and exception is None:
+            try:
+                with torch.no_grad():
+                    item = (f(), None)
+            except Exception as e:
+                exception = e
+                item = (None, e)
+            # Block until the item is consumed, or the consumer is closed.
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    break
+                except Full:
+                    pass
+
+    thread = threading.Thread(target=produce, daemon=True)
+    producer = (stop, thread)
+    _producers.add(producer)
+    thread.start()
+    try:
+        while True:
+            item, exception = queue.get()
+            if exception is not None:
+                raise exception
+            yield item
+    finally:
+        _producers.discard(producer)
+        _stop_producer(stop, thread, queue)
+
+
+_producers = set()
+
+
+def _stop_producer(stop, thread, queue=None):
+    stop.set()
+    # Release the prefetched results, the producer exits after its current call of ``f``.
+    while queue is not None:
+        try:
+            queue.get_nowait()
+        except Empty:
+            break
+    thread.join()
+
+
+@atexit.register
+def _stop_producers():
+    # Producers of generators which were never closed are stopped before the
+    # interpreter shuts down, rather than being killed inside a torch operation.
+    for stop, thread in list(_producers):
+        _stop_producer(stop, thread)
+    _producers.clear()
@@ -1,3 +1,6 @@
 from .constraint import confidence_level
 from .constraint import highest_density_level
 from .constraint import likelihood_ratio_test_statistic
+from .distribution import ProductPrior
+from .distribution import Truncated
+from .distribution import TruncatedNormal
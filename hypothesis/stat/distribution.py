@@ -0,0 +1,199 @@
+r"""Batched distributions to construct priors.
+
+All distributions are sampled and evaluated with tensor operations, drawing a
+large batch of a prior is therefore not a loop over the samples. Example
+usage::
+
+    prior = ProductPrior([
+        TruncatedNormal(1, 1, 0, 10),
+        Uniform(torch.zeros(2), torch.ones(2))])
+    inputs = prior.sample(torch.Size([100000])) # Shape (100000, 3).
+    log_probabilities = prior.log_prob(inputs) # Shape (100000,).
+"""
+
+import math
+import torch
+
+from torch.distributions import constraints
+from torch.distributions.distribution import Distribution
+from torch.distributions.normal import Normal
+
+
+
+class Truncated(Distribution):
+    r"""Truncates a univariate distribution to the interval ``[lower, upper]``.
+
+    Samples are drawn by inverse transform sampling, which requires the
+    cumulative distribution function and its inverse of the truncated
+    distribution. Contrary to rejection sampling, the cost of a draw does not
+    depend on the mass of the interval.
+
+    Args:
+        distribution (Distribution): the distribution to truncate.
+        lower (float or Tensor): lower bound of the interval.
+        upper (float or Tensor): upper bound of the interval.
+    """
+
+    arg_constraints = {}
+    has_rsample = True
+
+    def __init__(self, distribution, lower, upper):
+        batch_shape = distribution.batch_shape
+        # The bounds take the type of the distribution, without drawing from the global generator.
+        try:
+            reference = distribution.mean
+        except NotImplementedError:
+            reference = torch.as_tensor(lower if torch.is_tensor(lower) else upper, dtype=torch.get_default_dtype())
+        self.distribution = distribution
+        self.lower = torch.as_tensor(lower, dtype=reference.dtype, device=reference.device).expand(batch_shape)
+        self.upper = torch.as_tensor(upper, dtype=reference.dtype, device=reference.device).expand(batch_shape)
+        self.cdf_lower = distribution.cdf(self.lower)
+        self.cdf_upper = distribution.cdf(self.upper)
+        self.log_normalizer = (self.cdf_upper - self.cdf_lower).log()
+        super(Truncated, self).__init__(batch_shape=batch_shape, validate_args=False)
+
+    @constraints.dependent_property
+    def support(self):
+        return constraints.interval(self.lower, self.upper)
+
+    def rsample(self, sample_shape=torch.Size()):
+        shape = self._extended_shape(sample_shape)
+        u = torch.rand(shape, dtype=self.lower.dtype, device=self.lower.device)
+        x = self.icdf(u)
+
+        # Guard against numerical errors of the inverse in the tails.
+        return torch.max(torch.min(x, self.upper), self.lower)
+
+    def log_prob(self, value):
+        inside = (value >= self.lower) & (value <= self.upper)
+        # Evaluate the outside values inside the support of the distribution.
+        clamped = torch.max(torch.min(value, self.upper), self.lower)
+        log_probabilities = self.distribution.log_prob(clamped) - self.log_normalizer
+
+        return torch.where(inside, log_probabilities, torch.full_like(log_probabilities, -math.inf))
+
+    def cdf(self, value):
+        clamped = torch.max(torch.min(value, self.upper), self.lower)
+
+        return (self.distribution.cdf(clamped) - self.cdf_lower) / (self.cdf_upper - self.cdf_lower)
+
+    def icdf(self, value):
+        return self.distribution.icdf(self.cdf_lower + value * (self.cdf_upper - self.cdf_lower))
+
+
+
+class TruncatedNormal(Truncated):
+    r"""Normal distribution truncated to the interval ``[lower, upper]``."""
+
+    def __init__(self, loc, scale, lower, upper):
+        loc = torch.as_tensor(loc).float()
+        scale = torch.as_tensor(scale).float()
+        super(TruncatedNormal, self).__init__(Normal(loc, scale), lower, upper)
+
+
+
+class ProductPrior(Distribution):
+    r"""Prior of independent components.
+
+    The samples of the components are flattened and concatenated along the
+    last dimension, such that a batch of ``n`` samples has the shape
+    ``(n, dimensionality)``. The log probability of a batch is the sum of the
+    log probabilities of the components, and has the shape ``(n,)``. Samples
+    outside the support of the prior have a log probability of ``-inf``.
+
+    Args:
+        distributions (list): the distributions of the components.
+    """
+
+    arg_constraints = {}
+
+    def __init__(self, distributions):
+        self.distributions = list(distributions)
+        self.shapes = [d.batch_shape + d.event_shape for d in self.distributions]
+        self.sizes = [int(torch.Size(shape).numel()) for shape in self.shapes]
+        self.supports = [_support(d) for d in self.distributions]
+        # Values inside the support, to evaluate the samples outside the support.
+        self.fallbacks = [_point_in_support(d, support) for d, support in zip(self.distributions, self.supports)]
+        event_shape = torch.Size([sum(self.sizes)])
+        super(ProductPrior, self).__init__(event_shape=event_shape, validate_args=False)
+
+    @property
+    def has_rsample(self):
+        return all(d.has_rsample for d in self.distributions)
+
+    def _concatenate(self, samples, sample_shape):
+        samples = [x.reshape(sample_shape + torch.Size([-1])) for x in samples]
+
+        return torch.cat(samples, dim=-1)
+
+    def sample(self, sample_shape=torch.Size()):
+        sample_shape = torch.Size(sample_shape)
+
+        return self._concatenate([d.sample(sample_shape) for d in self.distributions], sample_shape)
+
+    def rsample(self, sample_shape=torch.Size()):
+        sample_shape = torch.Size(sample_shape)
+
+        return self._concatenate([d.rsample(sample_shape) for d in self.distributions], sample_shape)
+
+    def log_prob(self, value):
+        sample_shape = value.shape[:-1]
+        log_probabilities = 0
+        components = zip(self.distributions, self.shapes, self.supports, self.fallbacks, value.split(self.sizes, dim=-1))
+        for d, shape, support, fallback, x in components:
+            x = x.reshape(sample_shape + shape)
+            # Components without a support handle the values outside of it themselves.
+            if support is None:
+                log_probability = d.log_prob(x)
+            else:
+                inside = support.check(x)
+                mask = inside.reshape(inside.shape + (1,) * (x.dim() - inside.dim()))
+                log_probability = d.log_prob(torch.where(mask, x, fallback.to(x.device, x.dtype)))
+                inside = inside.reshape(log_probability.shape + (-1,)).all(dim=-1)
+                log_probability = torch.where(inside, log_probability, torch.full_like(log_probability, -math.inf))
+            # Sum the log probabilities of the batch dimensions of the component.
+            dimensions = len(d.batch_shape)
+            if dimensions > 0:
+                log_probability = log_probability.sum(dim=tuple(range(-dimensions, 0)))
+            log_probabilities = log_probabilities + log_probability
+
+        return log_probabilities
+
+
+
+def _support(distribution):
+    try:
+        return distribution.support
+    except NotImplementedError:
+        return None
+
+
+def _point_in_support(distribution, support):
+    r"""Deterministic value inside the support of a distribution.
+
+    The mean is used when it lies inside the support, otherwise the value is
+    derived from the bounds of the support.
+    """
+    if support is None:
+        return None
+    shape = distribution.batch_shape + distribution.event_shape
+    try:
+        point = distribution.mean.expand(shape)
+        if torch.isfinite(point).all() and support.check(point).all():
+            return point.clone()
+    except NotImplementedError:
+        pass
+    lower = getattr(support, "lower_bound", None)
+    upper = getattr(support, "upper_bound", None)
+    if lower is not None and upper is not None:
+        point = (torch.as_tensor(lower) + torch.as_tensor(upper)) / 2
+        if support.is_discrete:
+            point = point.floor()
+    elif lower is not None:
+        point = torch.as_tensor(lower) + 1
+    elif upper is not None:
+        point = torch.as_tensor(upper) - 1
+    else:
+        point = torch.zeros(())
+
+    return torch.as_tensor(point, dtype=torch.get_default_dtype()).expand(shape).clone()
@@ -7,14 +7,28 @@ import warnings
 
 
 class Chain:
-    r"""Summary of a Markov chain produced by an MCMC sampler."""
+    r"""Summary of a Markov chain produced by an MCMC sampler.
+
+    The acceptance probabilities and the acceptances are stored as float
+    and boolean tensors, or are ``None`` for a thinned chain.
+    """
 
     def __init__(self, samples, acceptance_probabilities, acceptances):
+        if acceptance_probabilities is not None:
+            acceptance_probabilities = torch.as_tensor(acceptance_probabilities, dtype=torch.float32).cpu()
+        if acceptances is not None:
+            acceptances = torch.as_tensor(acceptances, dtype=torch.bool).cpu()
         self.acceptance_probabilities = acceptance_probabilities
         self.acceptances = acceptances
         self.samples = samples.cpu()
         self.shape = samples.shape
 
+    def acceptance_rate(self):
+        if self.acceptances is None:
+            return None
+
+        return self.acceptances.float().mean().item()
+
     def mean(self, parameter_index=None):
         with torch.no_grad():
             mean = self.samples[:, parameter_index].mean(dim=0).squeeze()
@@ -64,9 +78,9 @@ class Chain:
             n = samples.shape[axis]
             f = np.fft.fft(samples - np.mean(samples, axis=axis), n=2 * n, axis=axis)
             m[axis] = slice(0, n)
-            samples = np.fft.ifft(f * np.conjugate(f), axis=axis)[m].real
+            samples = np.fft.ifft(f * np.conjugate(f), axis=axis)[tuple(m)].real
             m[axis] = 0
-            acf = samples / samples[m]
+            acf = samples / samples[tuple(m)]
 
         return torch.from_numpy(acf).float()
 
@@ -5,3 +5,4 @@ r""""""
 from hypothesis.util.data.distribution_dataset import DistributionDataset
 from hypothesis.util.data.simulation_tensor_dataset import SimulationTensorDataset
 from hypothesis.util.data.simulator_dataset import SimulatorDataset
+from hypothesis.util.data.simulator_iterable_dataset import SimulatorIterableDataset
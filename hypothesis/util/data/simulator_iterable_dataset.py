@@ -0,0 +1,104 @@
+import hypothesis
+import numpy as np
+import torch
+
+from hypothesis.exception import SimulatorException
+from hypothesis.simulation.seed import derive_seeds
+from hypothesis.simulation.seed import fork_rng
+from torch.utils.data import IterableDataset
+from torch.utils.data import get_worker_info
+
+
+
+class SimulatorIterableDataset(IterableDataset):
+    r"""Iterable dataset generating batches of the joint in a single call.
+
+    Every item is a batch ``(inputs, outputs)`` of ``batch_size`` samples,
+    obtained by a single ``prior.sample`` and a single simulator call. The
+    dataset should therefore be loaded without automatic batching::
+
+        dataset = SimulatorIterableDataset(simulator, prior, size=1000000, batch_size=256)
+        loader = DataLoader(dataset, batch_size=None, num_workers=8)
+
+    The batches are divided across the DataLoader workers. Rows of which the
+    outputs are invalid (by default, non-finite) are resampled from the prior
+    and simulated again, at most ``max_retries`` times. When a ``seed`` is
+    specified, every batch is simulated under its own derived seed (see
+    ``hypothesis.simulation.seed``), and the dataset is reproducible
+    regardless of the number of workers. Retries are reported to the
+    optional ``profiler`` (see ``hypothesis.simulation.profiler``).
+    """
+
+    def __init__(self, simulator, prior,
+        size=1000000,
+        batch_size=hypothesis.default.batch_size,
+        max_retries=10,
+        seed=None,
+        is_valid=None,
+        profiler=None):
+        super(SimulatorIterableDataset, self).__init__()
+        if is_valid is None:
+            is_valid = self._is_finite
+        self.batch_size = int(batch_size)
+        self.is_valid = is_valid
+        self.max_retries = int(max_retries)
+        self.prior = prior
+        self.profiler = profiler
+        self.seed = seed
+        self.simulator = simulator
+        self.size = int(size)
+
+    def _num_batches(self):
+        return -(-self.size // self.batch_size)
+
+    def _batches(self):
+        worker = get_worker_info()
+        if worker is None:
+            return range(self._num_batches())
+
+        return range(worker.id, self._num_batches(), worker.num_workers)
+
+    def _sample_inputs(self, n):
+        return self.prior.sample(torch.Size([n])).view(n, -1)
+
+    @torch.no_grad()
+    def _simulate(self, n):
+        inputs = self._sample_inputs(n)
+        outputs = self.simulator(inputs)
+        for _ in range(self.max_retries):
+            failed = ~self.is_valid(outputs)
+            if not failed.any():
+                return inputs, outputs
+            # Resample and simulate the failed rows only.
+            indices = failed.nonzero().view(-1)
+            if self.profiler is not None:
+                self.profiler.record_retries(len(indices))
+            inputs[indices] = self._sample_inputs(len(indices))
+            outputs[indices] = self.simulator(inputs[indices])
+        if (~self.is_valid(outputs)).any():
+            raise SimulatorException("Simulations still failing after " + str(self.max_retries) + " retries.")
+
+        return inputs, outputs
+
+    def __iter__(self):
+        worker = get_worker_info()
+        # Forked workers share the NumPy state of the main process.
+        if self.seed is None and worker is not None:
+            np.random.seed(worker.seed % 2 ** 32)
+        if self.seed is not None:
+            seeds = derive_seeds(self.seed, self._num_batches())
+        for index in self._batches():
+            n = min(self.batch_size, self.size - index * self.batch_size)
+            if self.seed is not None:
+                with fork_rng(seeds[index]):
+                    batch = self._simulate(n)
+            else:
+                batch = self._simulate(n)
+            yield batch
+
+    def __len__(self):
+        return self._num_batches()
+
+    @staticmethod
+    def _is_finite(outputs):
+        return torch.isfinite(outputs.view(outputs.shape[0], -1)).all(dim=1)